@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Shared Dataverse scaffolding for the create_*_table.py scripts.
+
+Provides one cached PublicClientApplication + access token and one keep-alive
+requests.Session for the whole process, the column definition helpers, and
+create_table_and_columns() which runs the full create/verify flow for a table.
+A driver that creates several tables in one run signs in and connects once.
+"""
+
+import argparse
+import copy
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from msal import PublicClientApplication
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.dataverse import json_dumps
+
+# Dataverse Configuration
+DATAVERSE_ENVIRONMENT = "https://orgbf93e3c3.crm.dynamics.com"
+TENANT_ID = "c8b6ba98-3fc0-4153-83a9-01374492c0f5"
+
+# Public client ID for interactive auth (no secret needed)
+CLIENT_ID = "51f81489-12ee-4a9e-aaae-a2591f45987d"  # Microsoft Azure PowerShell
+
+AUTHORITY = f"https://login.microsoftonline.com/{TENANT_ID}"
+SCOPES = [f"{DATAVERSE_ENVIRONMENT}/.default"]
+API_URL = f"{DATAVERSE_ENVIRONMENT}/api/data/v9.2"
+
+# One keep-alive session for every metadata call (reuses a single TLS connection);
+# transient 429/5xx responses are retried with backoff, but never for POST: a metadata
+# create that hits a gateway 504 often completes server-side, and a replay then fails
+# with "already exists"
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    ),
+))
+
+# Process-wide MSAL app and token, shared by every table created in this run
+_APP = None
+_TOKEN = None
+
+
+def _label(text):
+    """Build a Dataverse Label with a single English (1033) LocalizedLabel"""
+    return {
+        "@odata.type": "Microsoft.Dynamics.CRM.Label",
+        "LocalizedLabels": [{"@odata.type": "Microsoft.Dynamics.CRM.LocalizedLabel", "Label": text, "LanguageCode": 1033}]
+    }
+
+
+def _req(level):
+    """Build a RequiredLevel managed property for the given level"""
+    return {"Value": level, "CanBeChanged": True, "ManagedPropertyLogicalName": "canmodifyrequirementlevelsettings"}
+
+
+# Fixed parts of each column type; the helpers below deep-copy and fill these in
+_STRING_SKELETON = {
+    "@odata.type": "Microsoft.Dynamics.CRM.StringAttributeMetadata",
+    "AttributeType": "String",
+    "AttributeTypeName": {"Value": "StringType"}
+}
+
+_DECIMAL_SKELETON = {
+    "@odata.type": "Microsoft.Dynamics.CRM.DecimalAttributeMetadata",
+    "AttributeType": "Decimal",
+    "AttributeTypeName": {"Value": "DecimalType"},
+    "MinValue": -100000000000.0,
+    "MaxValue": 100000000000.0,
+    "RequiredLevel": _req("None")
+}
+
+_INTEGER_SKELETON = {
+    "@odata.type": "Microsoft.Dynamics.CRM.IntegerAttributeMetadata",
+    "AttributeType": "Integer",
+    "AttributeTypeName": {"Value": "IntegerType"},
+    "MinValue": -2147483648,
+    "MaxValue": 2147483647,
+    "RequiredLevel": _req("None")
+}
+
+_DATETIME_SKELETON = {
+    "@odata.type": "Microsoft.Dynamics.CRM.DateTimeAttributeMetadata",
+    "AttributeType": "DateTime",
+    "AttributeTypeName": {"Value": "DateTimeType"}
+}
+
+
+def string_col(schema_name, display_name, max_length=100, required=False):
+    """Build a StringAttributeMetadata column definition"""
+    d = copy.deepcopy(_STRING_SKELETON)
+    d["SchemaName"] = schema_name
+    d["DisplayName"] = _label(display_name)
+    d["MaxLength"] = max_length
+    d["RequiredLevel"] = _req("ApplicationRequired" if required else "None")
+    return d
+
+
+def decimal_col(schema_name, display_name, precision=2):
+    """Build a DecimalAttributeMetadata column definition"""
+    d = copy.deepcopy(_DECIMAL_SKELETON)
+    d["SchemaName"] = schema_name
+    d["DisplayName"] = _label(display_name)
+    d["Precision"] = precision
+    return d
+
+
+def integer_col(schema_name, display_name):
+    """Build an IntegerAttributeMetadata column definition"""
+    d = copy.deepcopy(_INTEGER_SKELETON)
+    d["SchemaName"] = schema_name
+    d["DisplayName"] = _label(display_name)
+    return d
+
+
+def datetime_col(schema_name, display_name, date_only=True, required=False):
+    """Build a DateTimeAttributeMetadata column definition"""
+    d = copy.deepcopy(_DATETIME_SKELETON)
+    d["SchemaName"] = schema_name
+    d["DisplayName"] = _label(display_name)
+    d["Format"] = "DateOnly" if date_only else "DateAndTime"
+    d["RequiredLevel"] = _req("ApplicationRequired" if required else "None")
+    return d
+
+
+def _headers(token):
+    """Standard Web API headers for an authenticated Dataverse request"""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json",
+        "OData-MaxVersion": "4.0",
+        "OData-Version": "4.0",
+        "Accept": "application/json",
+        # Metadata writes only need the status code, not the created definition
+        "Prefer": "return=minimal"
+    }
+
+
+def _is_headless():
+    """True when no browser can be opened (no TTY, or Linux without a display)"""
+    if not sys.stdin.isatty():
+        return True
+    return sys.platform.startswith("linux") and not os.environ.get("DISPLAY")
+
+
+def get_access_token(device_code=False):
+    """Get access token using interactive browser flow, or device code flow when headless"""
+    global _APP
+    if _APP is None:
+        _APP = PublicClientApplication(
+            client_id=CLIENT_ID,
+            authority=AUTHORITY
+        )
+    app = _APP
+
+    # Try to get token from cache first
+    accounts = app.get_accounts()
+    if accounts:
+        print(f"Found cached account: {accounts[0]['username']}")
+        result = app.acquire_token_silent(SCOPES, account=accounts[0])
+        if result:
+            return result['access_token']
+
+    print("\nAuthentication required...")
+    if device_code or _is_headless():
+        # Device code flow: sign in from any browser, no local web server needed
+        flow = app.initiate_device_flow(scopes=SCOPES)
+        if "user_code" not in flow:
+            raise Exception(f"Failed to start device code flow: {flow.get('error_description', flow)}")
+        print(flow["message"])
+        result = app.acquire_token_by_device_flow(flow)
+    else:
+        # Use interactive browser flow
+        print("A browser window will open for you to sign in...")
+        result = app.acquire_token_interactive(
+            scopes=SCOPES,
+            prompt="select_account"
+        )
+
+    if "access_token" in result:
+        print(f"✓ Authenticated as: {result.get('id_token_claims', {}).get('preferred_username', 'Unknown')}")
+        return result["access_token"]
+    else:
+        raise Exception(f"Authentication failed: {result.get('error_description', result)}")
+
+
+def get_token(device_code=False):
+    """Return the process-wide token, signing in and configuring SESSION on first use"""
+    global _TOKEN
+    if _TOKEN is None:
+        token = get_access_token(device_code=device_code)
+        SESSION.headers.update(_headers(token))
+
+        # Pre-flight: fail fast on a bad token before any metadata is written
+        SESSION.get(f"{API_URL}/WhoAmI", timeout=10).raise_for_status()
+        _TOKEN = token
+    return _TOKEN
+
+
+def create_table(schema_name, display_name, description, collection_name=None):
+    """Create a user-owned table with a crf63_name primary name column"""
+    # Table definition with primary attribute.
+    # Dataverse rejects an EntityMetadata POST without exactly one IsPrimaryName
+    # string attribute, and the loaders populate crf63_name, so it stays in-line.
+    # FormatName defaults to Text, so only the required properties are sent.
+    table_definition = {
+        "@odata.type": "Microsoft.Dynamics.CRM.EntityMetadata",
+        "Attributes": [
+            {
+                "@odata.type": "Microsoft.Dynamics.CRM.StringAttributeMetadata",
+                "SchemaName": "crf63_name",
+                "IsPrimaryName": True,
+                "RequiredLevel": _req("None"),
+                "MaxLength": 200,
+                "DisplayName": _label("Name")
+            }
+        ],
+        "DisplayName": _label(display_name),
+        "DisplayCollectionName": _label(collection_name or display_name),
+        "Description": _label(description),
+        "SchemaName": schema_name,
+        "HasActivities": False,
+        "HasNotes": False,
+        "IsActivity": False,
+        "OwnershipType": "UserOwned"
+    }
+
+    # Create the table
+    print(f"\nCreating table {schema_name}...")
+    response = SESSION.post(f"{API_URL}/EntityDefinitions", data=json_dumps(table_definition))
+
+    if response.status_code in [200, 201, 204]:
+        print("✓ Table created successfully!")
+        return True
+    else:
+        print(f"✗ Failed to create table: {response.status_code}")
+        print(f"Response: {response.text}")
+        return False
+
+
+def create_column(entity_logical_name, schema_name, body):
+    """Create a single column in the table from a pre-serialized JSON body"""
+    url = f"{API_URL}/EntityDefinitions(LogicalName='{entity_logical_name}')/Attributes"
+
+    response = SESSION.post(url, data=body)
+
+    if response.status_code in [200, 201, 204]:
+        return True
+
+    # Only touch the body on failure, and keep it to a short preview
+    print(f"    ✗ Failed to create {schema_name}: HTTP {response.status_code} {response.text[:300]}")
+    return False
+
+
+def get_existing_attributes(entity_logical_name):
+    """Return the set of attribute logical names already on the table (empty if not found)"""
+    url = f"{API_URL}/EntityDefinitions(LogicalName='{entity_logical_name}')?$select=LogicalName&$expand=Attributes($select=LogicalName)"
+    response = SESSION.get(url, timeout=60)
+
+    if response.status_code != 200:
+        return set()
+    return {a['LogicalName'] for a in response.json().get('Attributes', [])}
+
+
+def create_columns(entity_logical_name, columns):
+    """Create every column in `columns` that is not already on the table"""
+    print("\nCreating columns...")
+
+    # Only create columns that are not already on the table
+    existing = get_existing_attributes(entity_logical_name)
+    missing = [c for c in columns if c['SchemaName'].lower() not in existing]
+    for column in columns:
+        if column['SchemaName'].lower() in existing:
+            print(f"  ✓ {column['SchemaName']} already exists, skipping")
+    if not missing:
+        print(f"\n✓ All {len(columns)} columns already exist")
+        return True
+    columns = missing
+
+    # Serialize every column once up front (compact, already bytes)
+    bodies = [json_dumps(c) for c in columns]
+
+    # Create each column
+    success_count = 0
+    for i, (column, body) in enumerate(zip(columns, bodies), 1):
+        col_name = column['SchemaName']
+        display_name = column['DisplayName']['LocalizedLabels'][0]['Label']
+        print(f"  [{i}/{len(columns)}] Creating {col_name} ({display_name})...")
+
+        if create_column(entity_logical_name, col_name, body):
+            success_count += 1
+
+    print(f"\n✓ Created {success_count}/{len(columns)} columns successfully")
+    return success_count == len(columns)
+
+
+def create_alternate_key(entity_logical_name, key_attributes=("crf63_businesskey",), key_name="businesskey",
+                         display_name="Business Key"):
+    """Create alternate key on business key column(s) for faster upsert operations."""
+    print(f"\n🔑 Creating alternate key on {', '.join(key_attributes)}...")
+
+    # Get table metadata
+    url = f"{API_URL}/EntityDefinitions(LogicalName='{entity_logical_name}')?$select=MetadataId"
+    response = SESSION.get(url)
+
+    if response.status_code != 200:
+        print(f"❌ Failed to get table metadata: {response.status_code}")
+        return False
+
+    metadata_id = response.json().get("MetadataId")
+
+    # Define alternate key
+    key_definition = {
+        "SchemaName": f"{entity_logical_name}_{key_name}_key",
+        "DisplayName": _label(display_name),
+        "KeyAttributes": list(key_attributes)
+    }
+
+    # Create alternate key
+    url = f"{API_URL}/EntityDefinitions({metadata_id})/Keys"
+    response = SESSION.post(url, data=json_dumps(key_definition))
+
+    if response.status_code in [200, 204]:
+        print("✅ Alternate key created successfully")
+        print("   ⚠️  Note: Key activation may take several minutes")
+        return True
+
+    print(f"⚠️  Could not create alternate key: {response.status_code}")
+    print(f"   Response: {response.text[:500]}")
+    return False
+
+
+def table_exists(entity_logical_name):
+    """Cheap existence check that only selects LogicalName"""
+    url = f"{API_URL}/EntityDefinitions(LogicalName='{entity_logical_name}')?$select=LogicalName"
+    response = SESSION.get(url, timeout=30)
+    return response.status_code == 200
+
+
+def wait_for_table(entity_logical_name, timeout=30, interval=0.25):
+    """Poll until the new table is visible through the Web API, or the timeout expires"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if table_exists(entity_logical_name):
+            return True
+        time.sleep(interval)
+    return False
+
+
+def verify_table(entity_logical_name):
+    """Verify the table was created"""
+    print("\nVerifying table creation...")
+    url = f"{API_URL}/EntityDefinitions(LogicalName='{entity_logical_name}')?$select=SchemaName,LogicalName,DisplayName&$expand=Attributes($select=SchemaName,LogicalName,DisplayName)"
+
+    response = SESSION.get(url)
+
+    if response.status_code == 200:
+        data = response.json()
+        print(f"✓ Table found: {data['SchemaName']}")
+        print(f"  Display Name: {data['DisplayName']['LocalizedLabels'][0]['Label']}")
+        print(f"  Total Columns: {len(data['Attributes'])}")
+        return True
+    else:
+        print(f"✗ Table not found: {response.status_code}")
+        return False
+
+
+def parse_args(description, argv=None):
+    """Parse command-line flags that replace the interactive prompts"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--force-columns",
+        action="store_true",
+        default=None,
+        help="Add missing columns even if the table already exists",
+    )
+    parser.add_argument(
+        "--create-key",
+        dest="create_key",
+        action="store_true",
+        default=None,
+        help="Create the business key alternate key without prompting",
+    )
+    parser.add_argument(
+        "--no-create-key",
+        dest="create_key",
+        action="store_false",
+        help="Skip the business key alternate key without prompting",
+    )
+    parser.add_argument(
+        "--device-code",
+        action="store_true",
+        help="Sign in with the device code flow instead of opening a browser",
+    )
+    parser.add_argument(
+        "-y",
+        "--yes",
+        action="store_true",
+        help="Answer yes to every prompt (unattended runs)",
+    )
+    args = parser.parse_args(argv)
+    if args.yes:
+        if args.force_columns is None:
+            args.force_columns = True
+        if args.create_key is None:
+            args.create_key = True
+    return args
+
+
+def confirm(prompt, answer=None):
+    """Return a flag-provided answer, else ask when interactive, else assume no"""
+    if answer is not None:
+        return answer
+    if not sys.stdin.isatty():
+        print(f"{prompt} (y/n): n (non-interactive)")
+        return False
+    print(f"{prompt} (y/n): ", end="")
+    return input().lower() == 'y'
+
+
+def create_table_and_columns(schema_name, display_name, description, columns, args, collection_name=None):
+    """
+    Create a table (if missing), its columns and optionally its alternate key.
+
+    Returns False if the user chose not to touch an existing table, True otherwise.
+    Exits the process if the table itself cannot be created.
+    """
+    get_token(device_code=args.device_code)
+
+    # Check if table exists first
+    print("\nChecking if table already exists...")
+    if verify_table(schema_name):
+        print("\n✓ Table already exists!")
+        if not confirm("\nWould you like to add columns anyway?", args.force_columns):
+            print("Exiting...")
+            return False
+    else:
+        # Create table
+        if not create_table(schema_name, display_name, description, collection_name):
+            print("\n✗ Table creation failed. Exiting.")
+            sys.exit(1)
+
+        # Poll until the table is ready instead of sleeping a fixed amount
+        print("\nWaiting for table to be ready...")
+        if not wait_for_table(schema_name):
+            print("⚠️  Table not visible yet after 30s, continuing anyway")
+
+    # Create columns
+    if not create_columns(schema_name, columns):
+        print("\n⚠️  Some columns failed to create")
+
+    # Ask about creating alternate key
+    create_key = confirm("\nCreate alternate key for faster upsert operations?", args.create_key)
+
+    # Verify (runs alongside the alternate key POST; they are independent)
+    print("\n" + "=" * 70)
+    print("Final Verification:")
+    print("=" * 70)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        futures = [ex.submit(verify_table, schema_name)]
+        if create_key:
+            futures.append(ex.submit(create_alternate_key, schema_name))
+        for future in futures:
+            future.result()
+
+    return True
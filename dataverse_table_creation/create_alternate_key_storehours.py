@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Create the (store number, day of week) alternate key on crf63_storeoperatinghour.
+
+load_store_hours.py upserts with
+    PATCH crf63_storeoperatinghours(crf63_storenumber=125,crf63_dayofweek=1)
+which needs this key to be Active. Both columns already exist and are populated,
+so existing rows are matched without any backfill.
+
+Usage:
+    python create_alternate_key_storehours.py [--device-code]
+"""
+
+import sys
+
+from _common import parse_args, get_token, create_alternate_key
+
+TABLE_LOGICAL_NAME = "crf63_storeoperatinghour"
+KEY_ATTRIBUTES = ("crf63_storenumber", "crf63_dayofweek")
+
+
+def main(argv=None):
+    """Main execution"""
+    args = parse_args(f"Create the store/day alternate key on {TABLE_LOGICAL_NAME}", argv)
+
+    print("=" * 70)
+    print("Create Alternate Key for Store Operating Hours")
+    print(f"Table: {TABLE_LOGICAL_NAME}")
+    print(f"Key Attributes: {', '.join(KEY_ATTRIBUTES)}")
+    print("=" * 70)
+
+    get_token(device_code=args.device_code)
+    if not create_alternate_key(TABLE_LOGICAL_NAME, KEY_ATTRIBUTES, key_name="storeday", display_name="Store Day"):
+        return 1
+
+    print("\nNext steps:")
+    print("1. Wait 5-10 minutes for the key to activate (Power Apps > Tables > Store Operating Hour > Keys)")
+    print("2. Run: python load_store_hours.py")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
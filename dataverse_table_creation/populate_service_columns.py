@@ -13,57 +13,183 @@ Run after add_service_columns.py completes.
 import os
 import sys
 import uuid
-import json
+import random
+import re
 import time
 import concurrent.futures
+import io
+import itertools
 from datetime import datetime
 
+try:
+    from lxml import etree as ET
+    _HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _HAVE_LXML = False
+
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from modules.dataverse import HAVE_HTTP2, get_dataverse_access_token, json_dumps, retry_after_seconds
 from modules.utils.keyvault import get_dataverse_credentials, get_secret
+import numpy as np
+import pandas as pd
 import requests
-import msal
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+if HAVE_HTTP2:
+    import httpx
+
+# Rows parsed per block when streaming the XMLA response into the uploader
+STREAM_BLOCK_ROWS = 5000
+
+# One keep-alive session for XMLA and Dataverse; transient 429/5xx are retried with backoff
+# for reads only. POSTs (the MDX query, UpsertMultiple, $batch) are not replayed by the
+# adapter: the callers run their own loops and honour Retry-After on 429
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    ),
+))
+
+# Fixed headers of each $batch changeset part
+_PART_HEADERS = b"Content-Type: application/http\r\nContent-Transfer-Encoding: binary\r\n"
+_JSON_HEADERS = b"Content-Type: application/json\r\n\r\n"
+
+# Status line of each part in a $batch response; the group is the status class digit
+_BATCH_STATUS_LINE = re.compile(rb"^HTTP/1\.1 (\d)", re.MULTILINE)
+
+
+def _count_batch_successes(body):
+    """Count 2xx parts in a raw $batch response body in one pass over the bytes"""
+    return _BATCH_STATUS_LINE.findall(body).count(b"2")
+
+# XMLA Multidimensional (mddataset) element tags
+_MD = '{urn:schemas-microsoft-com:xml-analysis:mddataset}'
+_MD_AXIS = _MD + 'Axis'
+_MD_TUPLES = _MD + 'Tuples'
+_MD_TUPLE = _MD + 'Tuple'
+_MD_MEMBER = _MD + 'Member'
+_MD_CAPTION = _MD + 'Caption'
+_MD_CELLDATA = _MD + 'CellData'
+_MD_CELL = _MD + 'Cell'
+_MD_VALUE = _MD + 'Value'
+
+# Only these elements drive the parser; lxml can skip events for everything else
+_MD_EVENT_TAGS = (_MD_AXIS, _MD_TUPLES, _MD_TUPLE, _MD_CELLDATA, _MD_CELL)
+
+
+# NEW Service columns (14 total): (Dataverse column, OLAP measure, integer?)
+SERVICE_COLUMNS = [
+    ("crf63_smgavgclosure", 'SMG Avg Closure', False),
+    ("crf63_smgcasesopened", 'SMG Cases Opened', True),
+    ("crf63_smgcasesresolved", 'SMG Cases Resolved', True),
+    ("crf63_smgvaluepct", 'SMG Value %', False),
+    ("crf63_singles", 'Singles', True),
+    ("crf63_doubles", 'Doubles', True),
+    ("crf63_triplesplus", 'Triples Plus', True),
+    ("crf63_runs", 'Runs', True),
+    ("crf63_ttdtorders", 'TTDT Orders', True),
+    ("crf63_todoortimedispatch", 'To The Door Time for Dispatch Orders', False),
+    ("crf63_todoortimeminutes", 'To The Door Time Minutes', False),
+    ("crf63_tasteoffoodgood", 'TY Taste Of Food Good Survey Count', True),
+    ("crf63_tasteoffoodtotal", 'TY Total Taste Of Food Survey Count', True),
+    ("crf63_orderaccuracygood", 'TY Order Accuracy Good Survey Count', True),
+]
+
+
+# [Calendar].[Calendar Date] caption formats, most likely first
+_DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%m/%d/%Y', '%Y-%m-%d')
+
+
+def _detect_date_format(date_strings):
+    """Return the strptime format of the first non-empty caption (None = let pandas infer)"""
+    sample = next((d for d in date_strings if d), None)
+    if sample is None:
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            datetime.strptime(sample, fmt)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+
+def _caption(member):
+    """Return the text of a Member's direct Caption child (None if missing)"""
+    for child in member:
+        if child.tag == _MD_CAPTION:
+            return child.text
+    return None
+
+
+def _release(elem, container):
+    """Free a fully-processed Tuple/Cell (and anything before it) from the tree"""
+    if _HAVE_LXML:
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    else:
+        container.clear()
+
+# Every Service measure in the cube; only SERVICE_COLUMNS' measures are written to Dataverse
+ALL_SERVICE_MEASURES = [
+    'Make Time Minutes',
+    'Rack Time Minutes',
+    'Total OTD Time (Hours)',
+    'Deliveries',
+    'BOZOCORO Orders',
+    'OTD Order Count',
+    'Total Cash Over/Short USD',
+    'TY Total OSAT Survey Count',
+    'TY OSAT Satisfied Survey Count',
+    'Total Calls',
+    'Answered Calls',
+    'Mileage Cost Local',
+    'TY Total Order Accuracy Survey Count',
+    'Order Accuracy %',
+    'SMG Avg Closure',
+    'SMG Cases Opened',
+    'SMG Cases Resolved',
+    'SMG Value %',
+    'Doubles',
+    'Singles',
+    'Triples Plus',
+    'Runs',
+    'TTDT Orders',
+    'TY Dispatched Delivery Orders',
+    'To The Door Time for Dispatch Orders',
+    'To The Door Time Minutes',
+    'TY Taste Of Food Good Survey Count',
+    'TY Total Taste Of Food Survey Count',
+    'TY Order Accuracy Good Survey Count',
+]
 
-def get_service_metrics_mdx(fiscal_years=[2024, 2025]):
+def get_service_metrics_mdx(fiscal_years=[2024, 2025], all_measures=False):
     """
     Generate MDX query for Service metrics only.
-    Returns Store × Date dimension with 29 service measures.
+    Returns Store × Date dimension with the 14 measures mapped to Dataverse
+    columns, or all 29 service measures when all_measures=True.
     """
     fiscal_year_members = ", ".join([f"[Calendar].[Calendar Hierarchy].[Fiscal_Year].&[{year}]" for year in fiscal_years])
     where_clause = f"WHERE {{{fiscal_year_members}}}"
     
+    names = ALL_SERVICE_MEASURES if all_measures else [measure for _, measure, _ in SERVICE_COLUMNS]
+    measures = ",\n    ".join(f"[Measures].[{name}]" for name in names)
+    
     return f"""
 SELECT {{
-    [Measures].[Make Time Minutes],
-    [Measures].[Rack Time Minutes],
-    [Measures].[Total OTD Time (Hours)],
-    [Measures].[Deliveries],
-    [Measures].[BOZOCORO Orders],
-    [Measures].[OTD Order Count],
-    [Measures].[Total Cash Over/Short USD],
-    [Measures].[TY Total OSAT Survey Count],
-    [Measures].[TY OSAT Satisfied Survey Count],
-    [Measures].[Total Calls],
-    [Measures].[Answered Calls],
-    [Measures].[Mileage Cost Local],
-    [Measures].[TY Total Order Accuracy Survey Count],
-    [Measures].[Order Accuracy %],
-    [Measures].[SMG Avg Closure],
-    [Measures].[SMG Cases Opened],
-    [Measures].[SMG Cases Resolved],
-    [Measures].[SMG Value %],
-    [Measures].[Doubles],
-    [Measures].[Singles],
-    [Measures].[Triples Plus],
-    [Measures].[Runs],
-    [Measures].[TTDT Orders],
-    [Measures].[TY Dispatched Delivery Orders],
-    [Measures].[To The Door Time for Dispatch Orders],
-    [Measures].[To The Door Time Minutes],
-    [Measures].[TY Taste Of Food Good Survey Count],
-    [Measures].[TY Total Taste Of Food Survey Count],
-    [Measures].[TY Order Accuracy Good Survey Count]
+    {measures}
 }} 
 DIMENSION PROPERTIES PARENT_UNIQUE_NAME,HIERARCHY_UNIQUE_NAME ON COLUMNS,
 NON EMPTY CrossJoin(
@@ -77,7 +203,12 @@ CELL PROPERTIES VALUE, FORMAT_STRING, LANGUAGE, BACK_COLOR, FORE_COLOR, FONT_FLA
     """
 
 def execute_xmla_mdx(server, catalog, username, password, mdx_query, ssl_verify=False):
-    """Execute MDX query via XMLA"""
+    """
+    Execute MDX query via XMLA.
+
+    Returns the undecoded response stream (urllib3 raw) so the caller can feed
+    it straight into parse_service_response without building a str copy.
+    """
     xmla_url = f"{server}/xmla/default" if not server.endswith("/xmla/default") else server
     
     xmla_request = f"""<?xml version="1.0" encoding="UTF-8"?>
@@ -98,208 +229,416 @@ def execute_xmla_mdx(server, catalog, username, password, mdx_query, ssl_verify=
     </soap:Body>
 </soap:Envelope>"""
     
-    response = requests.post(
+    response = _SESSION.post(
         xmla_url,
         data=xmla_request.encode('utf-8'),
         headers={'Content-Type': 'text/xml; charset=utf-8', 'SOAPAction': 'urn:schemas-microsoft-com:xml-analysis:Execute'},
         auth=requests.auth.HTTPBasicAuth(username, password),
         verify=ssl_verify,
-        timeout=300
+        timeout=300,
+        stream=True
     )
     
     response.raise_for_status()
-    return response.text
+    response.raw.decode_content = True
+    return response.raw
 
-def parse_service_response(xml_response):
-    """Parse XMLA response and return list of records with service metrics"""
-    import xml.etree.ElementTree as ET
+def iter_service_blocks(xml_response, block_rows=None):
+    """
+    Stream an XMLA response as blocks of finished rows.
+
+    Yields (stores, dates, measures, cells) for consecutive row ranges: stores
+    and dates are 1-D object arrays, measures is the list of Axis0 captions and
+    cells is a (block rows x measures) object matrix of raw values (None = empty).
+    Cells arrive in CellOrdinal order, so a block is yielded as soon as the
+    parser moves past its last row; block_rows=None yields one block at the end.
+
+    Uses iterparse (lxml when installed, else the stdlib) so only the current
+    Tuple/Cell is held in memory. Accepts the response as str, bytes or a
+    binary file-like object.
+    """
+    if isinstance(xml_response, str):
+        xml_response = xml_response.encode('utf-8')
+    if isinstance(xml_response, bytes):
+        xml_response = io.BytesIO(xml_response)
     
-    root = ET.fromstring(xml_response)
+    measures = []   # Axis0: measure captions
+    stores = []     # Axis1: Store Number captions
+    dates = []      # Axis1: Calendar Date captions
+    cells = None    # CellData: current block of rows, allocated once the axes are known; empty = None
+    block_start = 0
+    cell_count = 0
+    axis_name = None
+    container = None
     
-    # Define namespaces
-    ns = {
-        'soap': 'http://schemas.xmlsoap.org/soap/envelope/',
-        'xsd': 'http://www.w3.org/2001/XMLSchema',
-        'mddataset': 'urn:schemas-microsoft-com:xml-analysis:mddataset',
-        'xsi': 'http://www.w3.org/2001/XMLSchema-instance'
-    }
+    def new_block(start):
+        size = len(stores) - start if block_rows is None else min(block_rows, len(stores) - start)
+        return np.full((size, len(measures)), None, dtype=object)
     
-    # Extract measure names from AxisInfo
-    measures = []
-    axis0 = root.find('.//mddataset:Axis[@name="Axis0"]', ns)
-    if axis0:
-        for tuple_elem in axis0.findall('.//mddataset:Tuple', ns):
-            member = tuple_elem.find('.//mddataset:Member', ns)
-            if member is not None:
-                caption = member.find('.//mddataset:Caption', ns)
-                if caption is not None:
-                    measures.append(caption.text)
-    
-    # Extract row dimensions (Store Number, Calendar Date)
-    rows = []
-    axis1 = root.find('.//mddataset:Axis[@name="Axis1"]', ns)
-    if axis1:
-        for tuple_elem in axis1.findall('.//mddataset:Tuple', ns):
-            members = tuple_elem.findall('.//mddataset:Member', ns)
-            if len(members) >= 2:
-                store = members[0].find('.//mddataset:Caption', ns).text
-                date = members[1].find('.//mddataset:Caption', ns).text
-                rows.append({'Store': store, 'Date': date})
-    
-    # Extract cell values
-    cell_data = root.find('.//mddataset:CellData', ns)
-    cells = []
-    if cell_data is not None:
-        for cell in cell_data.findall('.//mddataset:Cell', ns):
-            value_elem = cell.find('.//mddataset:Value', ns)
-            cells.append(value_elem.text if value_elem is not None else None)
-    
-    # Build records
-    records = []
-    for row_idx, row_info in enumerate(rows):
-        record = {
-            'store_number': row_info['Store'],
-            'calendar_date': row_info['Date'],
-            'service_metrics': {}
-        }
-        
-        # Map cell values to measures
-        for measure_idx, measure_name in enumerate(measures):
-            cell_idx = row_idx * len(measures) + measure_idx
-            if cell_idx < len(cells):
-                record['service_metrics'][measure_name] = cells[cell_idx]
+    def emit(start, block):
+        end = start + len(block)
+        return (np.array(stores[start:end], dtype=object), np.array(dates[start:end], dtype=object),
+                measures, block)
+    
+    iterparse_kwargs = {'tag': _MD_EVENT_TAGS} if _HAVE_LXML else {}
+    for event, elem in ET.iterparse(xml_response, events=('start', 'end'), **iterparse_kwargs):
+        tag = elem.tag
+        if event == 'start':
+            if tag == _MD_AXIS:
+                axis_name = elem.get('name')
+            elif tag == _MD_TUPLES:
+                container = elem
+            elif tag == _MD_CELLDATA:
+                container = elem
+                # Axes always precede CellData, so the grid size is final here
+                cells = new_block(0)
+            continue
         
-        records.append(record)
+        if tag == _MD_TUPLE:
+            # Tuple > Member > Caption is fixed, so walk direct children only
+            captions = [_caption(member) for member in elem if member.tag == _MD_MEMBER]
+            if axis_name == 'Axis0':
+                if captions:
+                    measures.append(captions[0])
+            elif axis_name == 'Axis1':
+                if len(captions) >= 2:
+                    stores.append(captions[0])
+                    dates.append(captions[1])
+            # Drop the finished tuple so the tree never grows past one tuple
+            _release(elem, container)
+        elif tag == _MD_CELL:
+            # Empty cells are omitted from CellData, so place each cell by its
+            # CellOrdinal (row * measures + measure) rather than by position
+            ordinal = elem.get('CellOrdinal')
+            ordinal = int(ordinal) if ordinal is not None else cell_count
+            cell_count = ordinal + 1
+            if not measures:
+                _release(elem, container)
+                continue
+            row, measure = divmod(ordinal, len(measures))
+            # Rows before this cell are complete; hand their block on
+            while row >= block_start + len(cells) and block_start + len(cells) < len(stores):
+                yield emit(block_start, cells)
+                block_start += len(cells)
+                cells = new_block(block_start)
+            if row < block_start + len(cells):
+                cells[row - block_start, measure] = elem.findtext(_MD_VALUE)
+            _release(elem, container)
+        elif tag == _MD_AXIS:
+            axis_name = None
     
-    print(f"✓ Parsed {len(records)} records with {len(measures)} service measures")
-    return records
+    if cells is None:
+        cells = new_block(0)
+    while True:
+        yield emit(block_start, cells)
+        block_start += len(cells)
+        if block_start >= len(stores):
+            break
+        cells = new_block(block_start)
+
+def parse_service_response(xml_response):
+    """
+    Parse XMLA response into column arrays.
+
+    Returns (stores, dates, measures, cells) as yielded by iter_service_blocks,
+    with cells covering every row (rows x measures).
+    """
+    blocks = list(iter_service_blocks(xml_response))
+    stores, dates, measures, cells = blocks[0]
+    print(f"✓ Parsed {len(stores)} records with {len(measures)} service measures")
+    return stores, dates, measures, cells
+
+def _coerce_numeric(column, is_int=False):
+    """
+    Convert one column of raw cell strings to float64 (or nullable Int64).
+
+    Empty cells and '', '-', ' ' become NaN. Raw XMLA values are plain numbers,
+    so pandas' C parser handles almost everything in one call; only the values
+    it rejects are retried with thousands separators stripped.
+    """
+    raw = pd.Series(column, dtype=object)
+    values = pd.to_numeric(raw, errors='coerce')
+    retry = values.isna() & raw.notna()
+    if retry.any():
+        values[retry] = pd.to_numeric(raw[retry].astype(str).str.replace(',', '', regex=False), errors='coerce')
+    values = values.astype('float64')
+    if is_int:
+        values = np.trunc(values).astype('Int64')
+    return values
 
-def transform_to_dataverse_updates(records):
-    """Transform OLAP records to Dataverse update payloads"""
-    updates = []
+def transform_to_dataverse_updates(stores, dates, measures, cells, verbose=True):
+    """Transform parsed OLAP columns to Dataverse update payloads (column-wise, via pandas)"""
+    if not len(stores):
+        if verbose:
+            print("✓ Transformed 0 update payloads")
+        return []
     
-    def to_float(val):
-        if val in (None, '', '-', ' '): return None
-        try:
-            return float(str(val).replace(',', ''))
-        except:
-            return None
+    # Parse every date in one pass with the pinned caption format;
+    # cache=True parses each distinct date once
+    parsed_dates = pd.to_datetime(
+        pd.Series(dates, dtype=object),
+        format=_detect_date_format(dates),
+        errors='coerce',
+        cache=True,
+    )
     
-    def to_int(val):
-        f = to_float(val)
-        return int(f) if f is not None else None
+    # Business key for lookup
+    df = pd.DataFrame({
+        "crf63_businesskey": pd.Series(stores, dtype=object).astype(str)
+                             + "_" + parsed_dates.dt.strftime('%Y%m%d')
+    })
     
-    for rec in records:
-        sm = rec['service_metrics']
-        
-        # Parse date
-        date_str = rec['calendar_date']
-        try:
-            from dateutil import parser
-            dt = parser.parse(date_str)
-            date_key = dt.strftime('%Y%m%d')
-        except:
+    # Map to Dataverse columns (only the NEW columns), one matrix column each
+    measure_idx = {measure: i for i, measure in enumerate(measures)}
+    for column, measure, is_int in SERVICE_COLUMNS:
+        if measure not in measure_idx:
             continue
-        
-        # Business key for lookup
-        business_key = f"{rec['store_number']}_{date_key}"
-        
-        # Map to Dataverse columns (only the NEW columns)
-        update_payload = {
-            "crf63_businesskey": business_key,
-            # NEW Service columns (14 total)
-            "crf63_smgavgclosure": to_float(sm.get('SMG Avg Closure')),
-            "crf63_smgcasesopened": to_int(sm.get('SMG Cases Opened')),
-            "crf63_smgcasesresolved": to_int(sm.get('SMG Cases Resolved')),
-            "crf63_smgvaluepct": to_float(sm.get('SMG Value %')),
-            "crf63_singles": to_int(sm.get('Singles')),
-            "crf63_doubles": to_int(sm.get('Doubles')),
-            "crf63_triplesplus": to_int(sm.get('Triples Plus')),
-            "crf63_runs": to_int(sm.get('Runs')),
-            "crf63_ttdtorders": to_int(sm.get('TTDT Orders')),
-            "crf63_todoortimedispatch": to_float(sm.get('To The Door Time for Dispatch Orders')),
-            "crf63_todoortimeminutes": to_float(sm.get('To The Door Time Minutes')),
-            "crf63_tasteoffoodgood": to_int(sm.get('TY Taste Of Food Good Survey Count')),
-            "crf63_tasteoffoodtotal": to_int(sm.get('TY Total Taste Of Food Survey Count')),
-            "crf63_orderaccuracygood": to_int(sm.get('TY Order Accuracy Good Survey Count')),
-        }
-        
-        # Remove None values
-        update_payload = {k: v for k, v in update_payload.items() if v is not None}
-        
+        df[column] = _coerce_numeric(cells[:, measure_idx[measure]], is_int)
+    
+    # Rows whose date could not be parsed are skipped
+    df = df[parsed_dates.notna().to_numpy()]
+    
+    # Remove None values; keyed by the raw (unescaped) business key so a
+    # repeated Store x Date keeps only its last payload
+    updates_by_key = {}
+    payload_count = 0
+    for row in df.astype(object).where(df.notna(), None).to_dict(orient='records'):
+        update_payload = {k: v for k, v in row.items() if v is not None}
         if len(update_payload) > 1:  # More than just business_key
-            updates.append(update_payload)
+            updates_by_key[update_payload['crf63_businesskey']] = update_payload
+            payload_count += 1
+    updates = list(updates_by_key.values())
     
-    print(f"✓ Transformed {len(updates)} update payloads")
+    if payload_count > len(updates):
+        print(f"⚠️  Dropped {payload_count - len(updates)} duplicate business keys")
+    if verbose:
+        print(f"✓ Transformed {len(updates)} update payloads")
     return updates
 
-def batch_update_dataverse(environment_url, access_token, table_name, updates):
-    """Batch update existing records with service metrics"""
+def fetch_record_ids(environment_url, access_token, table_name, id_column, session=_SESSION):
+    """Map crf63_businesskey -> record GUID for every existing row (paged via @odata.nextLink)"""
+    url = f"{environment_url.rstrip('/')}/api/data/v9.2/{table_name}?$select=crf63_businesskey,{id_column}"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json",
+        "Prefer": "odata.maxpagesize=5000"
+    }
+    
+    record_ids = {}
+    while url:
+        r = session.get(url, headers=headers, timeout=300)
+        r.raise_for_status()
+        data = r.json()
+        for row in data.get('value', []):
+            key = row.get('crf63_businesskey')
+            if key:
+                record_ids[key] = row[id_column]
+        url = data.get('@odata.nextLink')
+    
+    print(f"✓ Found {len(record_ids):,} existing record IDs")
+    return record_ids
+
+def _post(client, url, headers, body, timeout):
+    """POST raw bytes through either a requests.Session or an httpx.Client"""
+    if HAVE_HTTP2 and isinstance(client, httpx.Client):
+        return client.post(url, headers=headers, content=body, timeout=timeout)
+    return client.post(url, headers=headers, data=body, timeout=timeout)
+
+def batch_update_dataverse(environment_url, access_token, table_name, updates, session=None, max_workers=None,
+                           entity_logical_name=None, record_ids=None):
+    """
+    Batch update existing records with service metrics.
+
+    When entity_logical_name is given, each chunk is sent as one UpsertMultiple
+    call; if the table does not support the action (HTTP 404) the run falls
+    back to per-record PATCHes inside $batch.
+
+    record_ids (from fetch_record_ids) lets records that already exist be
+    addressed by GUID instead of by the business key alternate key; records
+    without an entry still go through the alternate key, so inserts work.
+    """
+    record_ids = record_ids or {}
+    
+    # With httpx[http2] installed, all workers multiplex over one HTTP/2
+    # connection (HPACK also compresses the repeated Authorization header);
+    # otherwise fall back to the pooled HTTP/1.1 session
+    owns_client = False
+    if session is None:
+        if HAVE_HTTP2:
+            session = httpx.Client(
+                http2=True,
+                timeout=600.0,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+            )
+            owns_client = True
+        else:
+            session = _SESSION
+    if max_workers is None:
+        max_workers = int(os.getenv('DV_MAX_WORKERS', '12'))
     api_url = f"{environment_url.rstrip('/')}/api/data/v9.2"
     batch_url = f"{api_url}/$batch"
+    bulk_url = f"{api_url}/{table_name}/Microsoft.Dynamics.CRM.UpsertMultiple"
+    bulk_supported = [entity_logical_name is not None]
     
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(pool_connections=20, pool_maxsize=20)
-    session.mount('https://', adapter)
-    session.headers.update({"Authorization": f"Bearer {access_token}"})
+    table_b = table_name.encode()
+    
+    def upsert_multiple(chunk):
+        """Send the chunk as one UpsertMultiple call; None if the action is unsupported"""
+        targets = []
+        for rec in chunk:
+            guid = record_ids.get(rec["crf63_businesskey"])
+            if guid:
+                ref = f"{table_name}({guid})"
+            else:
+                key = rec["crf63_businesskey"].replace("'", "''")
+                ref = f"{table_name}(crf63_businesskey='{key}')"
+            target = {
+                "@odata.type": f"Microsoft.Dynamics.CRM.{entity_logical_name}",
+                "@odata.id": ref,
+            }
+            target.update(rec)
+            targets.append(target)
+        body = json_dumps({"Targets": targets})
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        
+        for attempt in range(5):
+            try:
+                r = _post(session, bulk_url, headers, body, 600)
+                if r.status_code in (200, 204):
+                    # UpsertMultiple is all-or-nothing for the chunk
+                    return len(chunk), 0
+                if r.status_code == 404:
+                    if bulk_supported[0]:
+                        bulk_supported[0] = False
+                        print(f"\n⚠️  UpsertMultiple not available on {table_name}, falling back to $batch")
+                    return None
+                if r.status_code == 429:
+                    time.sleep(retry_after_seconds(r.headers.get("Retry-After"), 5) + random.uniform(0, 2))
+                    continue
+            except:
+                pass
+            time.sleep(1.5 ** attempt + random.random())
+        return 0, len(chunk)
+    
+    # Boundaries only need to be unique within one request, so draw them from a
+    # small pool generated up front instead of calling uuid4 twice per batch
+    boundary_pool = [uuid.uuid4().hex for _ in range(max(max_workers, 1) * 4)]
     
     def build_batch(batch_records):
-        batch_id = str(uuid.uuid4())
-        changeset_id = str(uuid.uuid4())
+        batch_id, changeset_id = random.sample(boundary_pool, 2)
+        changeset_b = f"--{changeset_id}\r\n".encode()
         parts = [f"--{batch_id}\r\nContent-Type: multipart/mixed;boundary={changeset_id}\r\n\r\n".encode()]
         
+        # Only the Content-ID, key and payload vary per part; everything else is pre-encoded
         for i, rec in enumerate(batch_records, 1):
-            key = rec["crf63_businesskey"].replace("'", "''")
-            payload = json.dumps(rec, separators=(',', ':'))
-            
-            part = (
-                f"--{changeset_id}\r\n"
-                f"Content-Type: application/http\r\n"
-                f"Content-Transfer-Encoding: binary\r\n"
-                f"Content-ID: {i}\r\n"
-                f"\r\n"
-                f"PATCH {table_name}(crf63_businesskey='{key}') HTTP/1.1\r\n"
-                f"Content-Type: application/json\r\n"
-                f"\r\n"
-                f"{payload}\r\n"
-            ).encode()
-            parts.append(part)
+            guid = record_ids.get(rec["crf63_businesskey"])
+            if guid:
+                # Known record: address it by GUID and leave the key out of the body
+                ref = b"(" + guid.encode() + b")"
+                payload = json_dumps({k: v for k, v in rec.items() if k != "crf63_businesskey"})
+            else:
+                key = rec["crf63_businesskey"].replace("'", "''")
+                ref = b"(crf63_businesskey='" + key.encode() + b"')"
+                payload = json_dumps(rec)
+            parts.extend((
+                changeset_b, _PART_HEADERS,
+                b"Content-ID: ", str(i).encode(), b"\r\n\r\n",
+                b"PATCH ", table_b, ref, b" HTTP/1.1\r\n",
+                _JSON_HEADERS, payload, b"\r\n",
+            ))
         
         parts.append(f"--{changeset_id}--\r\n--{batch_id}--\r\n".encode())
         return b"".join(parts), batch_id
     
     def update_batch(chunk):
+        if bulk_supported[0]:
+            result = upsert_multiple(chunk)
+            if result is not None:
+                return result
+        
         body, batch_id = build_batch(chunk)
-        headers = {"Content-Type": f"multipart/mixed; boundary={batch_id}"}
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": f"multipart/mixed; boundary={batch_id}"
+        }
         
-        for _ in range(5):
+        for attempt in range(5):
             try:
-                r = session.post(batch_url, headers=headers, data=body, timeout=600)
+                r = _post(session, batch_url, headers, body, 600)
                 if r.status_code in (200, 204):
-                    success = r.text.count("HTTP/1.1 204") + r.text.count("HTTP/1.1 200")
-                    return success
+                    success = _count_batch_successes(r.content)
+                    # A failed changeset answers with error parts instead of 2xx ones
+                    return success, len(chunk) - success
                 if r.status_code == 429:
-                    time.sleep(int(r.headers.get("Retry-After", 5)))
+                    # Jitter so throttled workers don't all retry at the same instant
+                    time.sleep(retry_after_seconds(r.headers.get("Retry-After"), 5) + random.uniform(0, 2))
                     continue
             except:
-                time.sleep(3)
-        return 0
+                pass
+            time.sleep(1.5 ** attempt + random.random())
+        return 0, len(chunk)
     
-    batch_size = 400
-    batches = [updates[i:i + batch_size] for i in range(0, len(updates), batch_size)]
-    print(f"\nUpdating {len(updates):,} records in {len(batches)} batches...")
+    # UpsertMultiple takes up to 1000 targets per call ($batch allows 1000 parts too)
+    batch_size = 1000 if bulk_supported[0] else 400
+    
+    # `updates` may be a list or a lazy iterable (e.g. payloads still being
+    # parsed); chunks are submitted as soon as they fill up
+    total = len(updates) if isinstance(updates, list) else None
+    if total is not None:
+        print(f"\nUpdating {total:,} records in {-(-total // batch_size)} batches...")
+    else:
+        print("\nUpdating records as they are parsed...")
+    
+    def chunks():
+        it = iter(updates)
+        while True:
+            chunk = list(itertools.islice(it, batch_size))
+            if not chunk:
+                return
+            yield chunk
     
     processed = 0
+    failed = 0
+    failed_batches = 0
+    batch_count = 0
     start_time = time.time()
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=6) as ex:
-        for future in concurrent.futures.as_completed([ex.submit(update_batch, c) for c in batches]):
-            processed += future.result()
-            rate = processed / (time.time() - start_time) if time.time() - start_time > 0 else 0
-            print(f"\r  Progress: {processed:,}/{len(updates):,} | {rate:,.0f} rows/sec", end='')
+    def collect(done):
+        nonlocal processed, failed, failed_batches
+        for future in done:
+            success, errors = future.result()
+            processed += success
+            failed += errors
+            if errors:
+                failed_batches += 1
+        rate = processed / (time.time() - start_time) if time.time() - start_time > 0 else 0
+        progress = f"{processed:,}/{total:,}" if total is not None else f"{processed:,}"
+        print(f"\r  Progress: {progress} | {rate:,.0f} rows/sec", end='')
+    
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+            pending = set()
+            for chunk in chunks():
+                pending.add(ex.submit(update_batch, chunk))
+                batch_count += 1
+                # Bound the backlog so a fast producer can't queue the whole dataset
+                if len(pending) >= max_workers * 2:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    collect(done)
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect(done)
+    finally:
+        if owns_client:
+            session.close()
     
     elapsed = time.time() - start_time
     print(f"\n✓ Updated {processed:,} records in {elapsed:.1f}s")
+    if failed:
+        print(f"⚠️  {failed:,} records failed in {failed_batches} of {batch_count} batches")
     return processed
 
 def main():
@@ -321,19 +660,29 @@ def main():
         
         # Get Dataverse token
         print("\n2. Getting Dataverse access token...")
-        app = msal.ConfidentialClientApplication(
-            creds['client_id'],
-            authority=f"https://login.microsoftonline.com/{creds['tenant_id']}",
-            client_credential=creds['client_secret']
+        dataverse_token = get_dataverse_access_token(
+            creds['environment_url'], creds['client_id'], creds['client_secret'], creds['tenant_id']
         )
-        token_result = app.acquire_token_for_client([f"{creds['environment_url']}/.default"])
-        dataverse_token = token_result["access_token"]
+        if not dataverse_token:
+            raise RuntimeError("Failed to obtain Dataverse access token")
         print("✓ Token obtained")
         
+        # Existing record IDs are only needed once uploads start, so fetch
+        # them while the OLAP query runs
+        id_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        record_ids_future = id_pool.submit(
+            fetch_record_ids,
+            creds['environment_url'],
+            dataverse_token,
+            'crf63_oarsbidatas',
+            'crf63_oarsbidataid'
+        )
+        id_pool.shutdown(wait=False)
+        
         # Query OLAP
         print("\n3. Querying OLAP cube for service metrics (2024-2025)...")
         mdx = get_service_metrics_mdx([2024, 2025])
-        xml_response = execute_xmla_mdx(
+        xml_stream = execute_xmla_mdx(
             olap_server,
             olap_catalog,
             olap_username,
@@ -341,24 +690,34 @@ def main():
             mdx,
             ssl_verify=False
         )
-        print(f"✓ Query executed ({len(xml_response):,} bytes)")
+        print("✓ Query executed, streaming response")
+        record_ids = record_ids_future.result()
         
-        # Parse response
-        print("\n4. Parsing OLAP response...")
-        records = parse_service_response(xml_response)
+        # Parse, transform and upload as one pipeline: each block of parsed rows
+        # is transformed and its batches are uploaded while parsing continues
+        print("\n4. Parsing, transforming and updating Dataverse records...")
+        parsed = {'rows': 0, 'payloads': 0}
         
-        # Transform to updates
-        print("\n5. Transforming to Dataverse update payloads...")
-        updates = transform_to_dataverse_updates(records)
+        def stream_updates():
+            for stores, dates, measures, cells in iter_service_blocks(xml_stream, block_rows=STREAM_BLOCK_ROWS):
+                parsed['rows'] += len(stores)
+                block_updates = transform_to_dataverse_updates(stores, dates, measures, cells, verbose=False)
+                parsed['payloads'] += len(block_updates)
+                yield from block_updates
         
-        # Batch update
-        print("\n6. Updating Dataverse records...")
-        updated = batch_update_dataverse(
-            creds['environment_url'],
-            dataverse_token,
-            'crf63_oarsbidatas',
-            updates
-        )
+        try:
+            updated = batch_update_dataverse(
+                creds['environment_url'],
+                dataverse_token,
+                'crf63_oarsbidatas',
+                stream_updates(),
+                entity_logical_name='crf63_oarsbidata',
+                record_ids=record_ids
+            )
+            print(f"✓ Parsed {parsed['rows']:,} records into {parsed['payloads']:,} update payloads "
+                  f"({xml_stream.tell():,} bytes received)")
+        finally:
+            xml_stream.close()
         
         print("\n" + "="*80)
         print("✓ Population Complete!")
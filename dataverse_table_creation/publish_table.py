@@ -4,11 +4,12 @@ Publish Dataverse table customizations
 Makes the table available via Web API
 """
 
-import requests
 import json
 from msal import PublicClientApplication
 import sys
 
+from _common import SESSION
+
 # Dataverse Configuration
 DATAVERSE_ENVIRONMENT = "https://orgbf93e3c3.crm.dynamics.com"
 TENANT_ID = "c8b6ba98-3fc0-4153-83a9-01374492c0f5"
@@ -60,7 +61,7 @@ def publish_table(table_name):
     url = f"{DATAVERSE_ENVIRONMENT}/api/data/v9.2/PublishXml"
     
     try:
-        response = requests.post(url, headers=headers, json=publish_request)
+        response = SESSION.post(url, headers=headers, json=publish_request)
         
         if response.status_code in [200, 204]:
             print(f"✅ Table '{table_name}' published successfully")
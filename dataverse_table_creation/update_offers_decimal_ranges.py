@@ -12,10 +12,12 @@ Usage:
   source .venv/bin/activate && python dataverse_table_creation/update_offers_decimal_ranges.py
 """
 
-import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from msal import PublicClientApplication
 
+from _common import SESSION
+
 DATAVERSE_ENVIRONMENT = "https://orgbf93e3c3.crm.dynamics.com"
 TENANT_ID = "c8b6ba98-3fc0-4153-83a9-01374492c0f5"
 CLIENT_ID = "51f81489-12ee-4a9e-aaae-a2591f45987d"  # Microsoft Azure PowerShell
@@ -83,7 +85,7 @@ def patch_decimal_range(token: str, logical_name: str, min_value: float, max_val
         },
     }
 
-    r = requests.post(url, headers=headers, json=payload)
+    r = SESSION.post(url, headers=headers, json=payload)
     if r.status_code in (200, 204):
         print(f"✓ Updated {logical_name}: MinValue={min_value}, MaxValue={max_value}")
         return
@@ -95,10 +97,22 @@ def main() -> int:
     token = get_access_token()
 
     print(f"\nUpdating decimal ranges on {TABLE_SCHEMA_NAME}...")
-    for col in DECIMAL_COLUMNS_TO_PATCH:
-        patch_decimal_range(token, col, MIN_DECIMAL, MAX_DECIMAL)
-        # small delay to reduce likelihood of transient gateway failures
-        time.sleep(0.2)
+    # Each UpdateAttribute call is independent; transient 429/5xx are retried by SESSION
+    failures = []
+    with ThreadPoolExecutor(max_workers=3) as ex:
+        futures = {
+            ex.submit(patch_decimal_range, token, col, MIN_DECIMAL, MAX_DECIMAL): col
+            for col in DECIMAL_COLUMNS_TO_PATCH
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"✗ {e}")
+                failures.append(futures[future])
+
+    if failures:
+        raise RuntimeError(f"Failed to update {len(failures)} column(s): {', '.join(failures)}")
 
     print("\n✓ Done. Decimal ranges updated.")
     return 0
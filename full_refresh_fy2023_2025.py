@@ -2,8 +2,10 @@
 """Full refresh (delete + backfill) for FY2023–FY2025.
 
 This script is intentionally explicit and safe:
-- Deletes all records from the target Dataverse tables.
-- Backfills by querying OLAP per fiscal year (FY2023, FY2024, FY2025) to avoid huge single queries.
+- Deletes all records from the target Dataverse tables (server-side BulkDelete job by
+  default; --delete-mode batch uses client-driven $batch DELETEs).
+- Backfills FY2023–FY2025 from one OLAP query with Fiscal_Year on rows, upserting one fiscal
+  year at a time (--fy-query per-year falls back to one query per fiscal year).
 
 Supported pipelines:
 - daily_sales  (OARS Franchise)
@@ -21,17 +23,21 @@ from __future__ import annotations
 
 import argparse
 import os
+import queue
+import random
+import re
 import sys
+import threading
 import time
 import uuid
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Dict, Iterable, List, Tuple
 
 import requests
 
-from modules.dataverse import get_dataverse_access_token, upsert_to_dataverse
+from modules.dataverse import BearerAuth, TokenCache, retry_after_seconds, upsert_to_dataverse
 from modules.utils.keyvault import get_secret
 from modules.pipeline_config import load_mapping, load_pipelines
 from modules.pipeline_runner import run_mdx_to_df, transform_df_to_records
@@ -47,12 +53,13 @@ class Target:
     pipeline_name: str
     table: str
     id_field: str
+    entity: str
 
 
 TARGETS: Dict[str, Target] = {
-    # Note: plural API name + primary key field name
-    "daily_sales": Target("daily_sales", "crf63_oarsbidatas", "crf63_oarsbidataid"),
-    "sales_channel": Target("sales_channel", "crf63_saleschanneldailies", "crf63_saleschanneldailyid"),
+    # Note: plural API name + primary key field name + logical (singular) name for BulkDelete
+    "daily_sales": Target("daily_sales", "crf63_oarsbidatas", "crf63_oarsbidataid", "crf63_oarsbidata"),
+    "sales_channel": Target("sales_channel", "crf63_saleschanneldailies", "crf63_saleschanneldailyid", "crf63_saleschanneldaily"),
 }
 
 
@@ -63,23 +70,39 @@ def _batch_delete(
     id_field: str,
     headers: Dict[str, str],
     refresh_auth: callable,
+    auth: requests.auth.AuthBase | None = None,
     fetch_top: int = 5000,
-    delete_batch_size: int = 100,
+    delete_batch_size: int = 500,
     max_workers: int = 8,
 ) -> int:
     deleted = 0
     start = time.time()
+    lock = threading.Lock()
+    # Halved on 413/429 so later changesets stay under what the server accepts
+    batch_size = min(delete_batch_size, 1000)
+
+    def shrink_batch_size(sent: int) -> None:
+        nonlocal batch_size
+        with lock:
+            # Half of the rejected batch, not of the current size, so one burst across
+            # all in-flight workers halves it once rather than once per worker
+            new_size = max(10, sent // 2)
+            if new_size < batch_size:
+                batch_size = new_size
+                print(f"  Delete batch size reduced to {batch_size}")
 
     def _sleep_backoff(attempt: int, base: float = 2.0, cap: float = 60.0) -> None:
-        delay = min(cap, base ** attempt)
+        # Jitter spreads workers that failed together so they don't retry in lockstep
+        delay = min(cap, base ** attempt) + random.uniform(0, base ** attempt * 0.25)
         time.sleep(delay)
 
-    while True:
-        fetch_url = f"{api_url}/{table}?$select={id_field}&$top={fetch_top}"
+    def fetch_page(url: str) -> dict:
         resp = None
         for attempt in range(0, 6):
             try:
-                resp = requests.get(fetch_url, headers=headers, timeout=(10, 120))
+                # Server-driven paging: maxpagesize (not $top) so Dataverse hands back @odata.nextLink
+                fetch_headers = {**headers, "Prefer": f"odata.maxpagesize={fetch_top}"}
+                resp = requests.get(url, headers=fetch_headers, auth=auth, timeout=(10, 120))
                 if resp.status_code == 200:
                     break
                 if resp.status_code in (401, 403):
@@ -93,80 +116,244 @@ def _batch_delete(
 
         if resp is None or resp.status_code != 200:
             raise RuntimeError(f"Fetch failed for {table} after retries")
+        return resp.json()
+
+    def delete_one_batch(batch_ids: List[str]) -> int:
+        batch_id = uuid.uuid4().hex
+        changeset_id = uuid.uuid4().hex
+
+        lines: List[str] = []
+        lines.append(f"--{batch_id}")
+        lines.append(f"Content-Type: multipart/mixed; boundary={changeset_id}")
+        lines.append("")
+        lines.append("")
+
+        for idx, rid in enumerate(batch_ids, 1):
+            lines.append(f"--{changeset_id}")
+            lines.append("Content-Type: application/http")
+            lines.append("Content-Transfer-Encoding: binary")
+            lines.append(f"Content-ID: {idx}")
+            lines.append("")
+            lines.append(f"DELETE {api_url}/{table}({rid}) HTTP/1.1")
+            lines.append("Content-Length: 0")
+            lines.append("")
+            lines.append("")
 
-        records = resp.json().get("value", [])
-        if not records:
-            break
-
-        ids = [r[id_field] for r in records if id_field in r]
-        if not ids:
-            break
+        lines.append(f"--{changeset_id}--")
+        lines.append(f"--{batch_id}--")
+        lines.append("")
 
-        batches = [ids[i : i + delete_batch_size] for i in range(0, len(ids), delete_batch_size)]
+        body = "\r\n".join(lines).encode("utf-8")
+        batch_headers = {"Content-Type": f"multipart/mixed; boundary={batch_id}"}
+        full_headers = {**headers, **batch_headers}
+        for attempt in range(0, 6):
+            try:
+                r = requests.post(f"{api_url}/$batch", headers=full_headers, data=body, auth=auth, timeout=(10, 600))
+                if r.status_code in (200, 202, 204):
+                    return len(batch_ids)
+                if r.status_code == 413 and len(batch_ids) > 1:
+                    # Payload too large: shrink future changesets and split this one
+                    shrink_batch_size(len(batch_ids))
+                    half = len(batch_ids) // 2
+                    return delete_one_batch(batch_ids[:half]) + delete_one_batch(batch_ids[half:])
+                if r.status_code == 429:
+                    shrink_batch_size(len(batch_ids))
+                    retry_after = r.headers.get("Retry-After")
+                    print(f"  Delete batch throttled (429); retry {attempt+1}/6")
+                    if retry_after:
+                        time.sleep(retry_after_seconds(retry_after, 5) + random.random() * 2)
+                        continue
+                    _sleep_backoff(attempt)
+                    continue
+                if r.status_code in (401, 403):
+                    print("  Auth expired during delete; refreshing token...")
+                    refresh_auth()
+                    full_headers = {**headers, **batch_headers}
+                    continue
+                print(
+                    f"  Delete batch retry {attempt+1}/6: HTTP {r.status_code} {r.text[:200]}"
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"  Delete batch retry {attempt+1}/6: {type(e).__name__}: {e}")
+            _sleep_backoff(attempt)
+        # Non-fatal: leave these rows for the next pass.
+        return 0
 
-        def delete_one_batch(batch_ids: List[str]) -> int:
-            batch_id = str(uuid.uuid4())
-            changeset_id = str(uuid.uuid4())
+    def report() -> None:
+        elapsed = time.time() - start
+        rate = (deleted / elapsed) if elapsed > 0 else 0
+        print(f"  Deleted so far: {deleted:,} ({rate:,.0f} rows/sec)")
 
-            lines: List[str] = []
-            lines.append(f"--{batch_id}")
-            lines.append(f"Content-Type: multipart/mixed; boundary={changeset_id}")
-            lines.append("")
-            lines.append("")
+    # Each pass walks the table once via nextLink while deletes run; a fresh pass only
+    # picks up stragglers whose delete batches failed.
+    while True:
+        first = fetch_page(f"{api_url}/{table}?$select={id_field}")
+        if not any(id_field in r for r in first.get("value", [])):
+            break
 
-            for idx, rid in enumerate(batch_ids, 1):
-                lines.append(f"--{changeset_id}")
-                lines.append("Content-Type: application/http")
-                lines.append("Content-Transfer-Encoding: binary")
-                lines.append(f"Content-ID: {idx}")
-                lines.append("")
-                lines.append(f"DELETE {api_url}/{table}({rid}) HTTP/1.1")
-                lines.append("Content-Length: 0")
-                lines.append("")
-                lines.append("")
-
-            lines.append(f"--{changeset_id}--")
-            lines.append(f"--{batch_id}--")
-            lines.append("")
+        work: "queue.Queue[List[str] | None]" = queue.Queue(maxsize=max_workers * 2)
 
-            body = "\r\n".join(lines).encode("utf-8")
-            batch_headers = {"Content-Type": f"multipart/mixed; boundary={batch_id}"}
-            full_headers = {**headers, **batch_headers}
-            for attempt in range(0, 6):
-                try:
-                    r = requests.post(f"{api_url}/$batch", headers=full_headers, data=body, timeout=(10, 600))
-                    if r.status_code in (200, 202, 204):
-                        return len(batch_ids)
-                    if r.status_code in (401, 403):
-                        print("  Auth expired during delete; refreshing token...")
-                        refresh_auth()
-                        full_headers = {**headers, **batch_headers}
-                        continue
-                    print(
-                        f"  Delete batch retry {attempt+1}/6: HTTP {r.status_code} {r.text[:200]}"
-                    )
-                except requests.exceptions.RequestException as e:
-                    print(f"  Delete batch retry {attempt+1}/6: {type(e).__name__}: {e}")
-                _sleep_backoff(attempt)
-            # Non-fatal: leave these rows for the next fetch loop.
-            return 0
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(delete_one_batch, b) for b in batches]
-            for fut in as_completed(futures):
+        def produce() -> None:
+            page = first
+            try:
+                while True:
+                    ids = [r[id_field] for r in page.get("value", []) if id_field in r]
+                    i = 0
+                    while i < len(ids):
+                        n = batch_size
+                        work.put(ids[i : i + n])
+                        i += n
+                    next_link = page.get("@odata.nextLink")
+                    if not next_link:
+                        break
+                    report()
+                    page = fetch_page(next_link)
+            finally:
+                for _ in range(max_workers):
+                    work.put(None)
+
+        def consume() -> None:
+            nonlocal deleted
+            while (batch_ids := work.get()) is not None:
                 try:
-                    deleted += fut.result()
+                    n = delete_one_batch(batch_ids)
                 except Exception as e:
-                    # Keep going; remaining rows will be retried on the next loop.
+                    # Keep going; remaining rows will be retried on the next pass.
                     print(f"  Delete worker error (continuing): {type(e).__name__}: {e}")
+                    continue
+                with lock:
+                    deleted += n
 
-        elapsed = time.time() - start
-        rate = (deleted / elapsed) if elapsed > 0 else 0
-        print(f"  Deleted so far: {deleted:,} ({rate:,.0f} rows/sec)")
+        with ThreadPoolExecutor(max_workers=max_workers + 1) as executor:
+            producer = executor.submit(produce)
+            for fut in [executor.submit(consume) for _ in range(max_workers)]:
+                fut.result()
+            producer.result()
+
+        report()
 
     return deleted
 
 
+def _bulk_delete(
+    *,
+    api_url: str,
+    entity: str,
+    headers: Dict[str, str],
+    auth: requests.auth.AuthBase | None = None,
+    poll_seconds: float = 15.0,
+    max_wait: float = 3600.0,
+    max_suspended: float = 600.0,
+    max_poll_errors: int = 5,
+) -> Tuple[int, int]:
+    """Delete every row of `entity` with a server-side BulkDelete job and wait for it.
+
+    One POST replaces the fetch-ids/DELETE-changeset round trips; Dataverse does the
+    work asynchronously and we poll the asyncoperation until it finishes.
+    Returns (success_count, failure_count) from the job's bulkdeleteoperation.
+    Raises RuntimeError if the job fails, runs past `max_wait` seconds, sits suspended
+    (statecode 1) for over `max_suspended` seconds, or `max_poll_errors` polls in a row
+    fail; an unfinished job is cancelled first so the caller can fall back to $batch.
+    """
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    payload = {
+        "QuerySet": [
+            {
+                "EntityName": entity,
+                "ColumnSet": {"AllColumns": False, "Columns": []},
+                "Criteria": {"FilterOperator": "And", "Conditions": [], "Filters": []},
+            }
+        ],
+        "JobName": f"full_refresh_{entity}_{ts}",
+        "SendEmailNotification": False,
+        "ToRecipients": [],
+        "CCRecipients": [],
+        "RecurrencePattern": "",
+        "StartDateTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    resp = requests.post(
+        f"{api_url}/BulkDelete",
+        headers={**headers, "Content-Type": "application/json"},
+        json=payload,
+        auth=auth,
+        timeout=(10, 120),
+    )
+    if resp.status_code != 200:
+        raise RuntimeError(f"BulkDelete submit failed for {entity}: HTTP {resp.status_code} {resp.text[:300]}")
+    job_id = resp.json()["JobId"]
+    print(f"  BulkDelete job {job_id} submitted; polling every {poll_seconds:.0f}s ...")
+
+    def give_up(reason: str) -> None:
+        # Best effort: cancel the job so it doesn't race the $batch fallback
+        try:
+            requests.patch(
+                f"{api_url}/asyncoperations({job_id})",
+                headers={**headers, "Content-Type": "application/json"},
+                json={"statecode": 3, "statuscode": 32},
+                auth=auth,
+                timeout=(10, 60),
+            )
+        except requests.exceptions.RequestException:
+            pass
+        raise RuntimeError(f"BulkDelete job {job_id} abandoned: {reason}")
+
+    start = time.time()
+    suspended_since = None
+    poll_errors = 0
+    while True:
+        time.sleep(poll_seconds)
+        elapsed = time.time() - start
+        if elapsed > max_wait:
+            give_up(f"not finished after {elapsed:,.0f}s")
+        try:
+            r = requests.get(
+                f"{api_url}/asyncoperations({job_id})?$select=statecode,statuscode,message",
+                headers=headers,
+                auth=auth,
+                timeout=(10, 60),
+            )
+        except requests.exceptions.RequestException as e:
+            r, error = None, f"{type(e).__name__}: {e}"
+        else:
+            error = None if r.status_code == 200 else f"HTTP {r.status_code} {r.text[:200]}"
+        if error:
+            poll_errors += 1
+            if poll_errors >= max_poll_errors:
+                give_up(f"{poll_errors} polls in a row failed, last: {error}")
+            print(f"  Poll retry ({poll_errors}/{max_poll_errors}): {error}")
+            continue
+        poll_errors = 0
+        job = r.json()
+        # statecode 1 = Suspended (waiting); 3 = Completed; statuscode 30 = Succeeded, 31 = Failed, 32 = Canceled
+        if job.get("statecode") == 3:
+            break
+        if job.get("statecode") == 1:
+            suspended_since = suspended_since or time.time()
+            if time.time() - suspended_since > max_suspended:
+                give_up(f"suspended for over {max_suspended:,.0f}s (statuscode {job.get('statuscode')}): {job.get('message')}")
+        else:
+            suspended_since = None
+        print(f"  ... job running ({elapsed:,.0f}s, statuscode {job.get('statuscode')})")
+
+    if job.get("statuscode") != 30:
+        raise RuntimeError(f"BulkDelete job {job_id} ended with statuscode {job.get('statuscode')}: {job.get('message')}")
+
+    r = requests.get(
+        f"{api_url}/bulkdeleteoperations?$filter=_asyncoperationid_value eq {job_id}&$select=successcount,failurecount",
+        headers=headers,
+        auth=auth,
+        timeout=(10, 60),
+    )
+    ops = r.json().get("value", []) if r.status_code == 200 else []
+    if not ops:
+        return 0, 0
+    return int(ops[0].get("successcount") or 0), int(ops[0].get("failurecount") or 0)
+
+
+# Greedy head so the match stops at the last WHERE, as the old upper()/rfind did
+_WHERE_RE = re.compile(r"^(.*)\bWHERE\b", re.IGNORECASE | re.DOTALL)
+
+
 def _inject_fiscal_year_where(mdx: str, fiscal_year: int) -> str:
     """Append/replace the WHERE clause with a Fiscal_Year filter.
 
@@ -174,11 +361,34 @@ def _inject_fiscal_year_where(mdx: str, fiscal_year: int) -> str:
     [Calendar].[Calendar Hierarchy].[Fiscal_Year].&[YYYY]
     """
     where = f"WHERE ([Calendar].[Calendar Hierarchy].[Fiscal_Year].&[{fiscal_year}])"
-    upper = mdx.upper()
-    idx = upper.rfind("WHERE")
-    if idx == -1:
-        return mdx.rstrip() + "\n" + where + "\n"
-    return mdx[:idx].rstrip() + "\n" + where + "\n"
+    m = _WHERE_RE.match(mdx)
+    head = m.group(1) if m else mdx
+    return head.rstrip() + "\n" + where + "\n"
+
+
+_ROWS_RE = re.compile(
+    r"NON\s+EMPTY\s+(?P<rows>.*?)(?P<props>\s+DIMENSION\s+PROPERTIES[\w\s,]*?)?\s+ON\s+ROWS",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Must precede the pipeline's own mappings so "Calendar.*" patterns don't claim it
+_FISCAL_YEAR_MAPPING = {"pattern": r"\[Calendar\]\.\[Calendar Hierarchy\]", "field": "FiscalYear"}
+
+
+def _fiscal_years_on_rows(mdx: str, fiscal_years: Iterable[int]) -> str:
+    """Rewrite a pipeline MDX into one query covering every fiscal year.
+
+    The Fiscal_Year members are cross-joined onto ROWS (so each row carries its FY
+    and the result can be partitioned client-side) and the WHERE slicer is dropped.
+    """
+    fy_set = ", ".join(f"[Calendar].[Calendar Hierarchy].[Fiscal_Year].&[{fy}]" for fy in fiscal_years)
+    m = _ROWS_RE.search(mdx)
+    if not m:
+        raise ValueError("Could not locate the NON EMPTY ... ON ROWS set in the MDX")
+    rows = f"NON EMPTY CrossJoin({{{fy_set}}}, {m.group('rows')}){m.group('props') or ''} ON ROWS"
+    mdx = mdx[: m.start()] + rows + mdx[m.end() :]
+    w = _WHERE_RE.match(mdx)
+    return (w.group(1) if w else mdx).rstrip() + "\n"
 
 
 def _myview_ids_for_sales_channel_backfill() -> List[int]:
@@ -227,6 +437,12 @@ def main() -> int:
         default="myview",
         help="Backfill mode for sales_channel. 'fy' attempts FY2023–FY2025 slicing; 'myview' uses validated MyView runs. Default: myview",
     )
+    parser.add_argument(
+        "--fy-query",
+        choices=["single", "per-year"],
+        default="single",
+        help="FY backfill: 'single' runs one MDX with Fiscal_Year on rows and splits the result; 'per-year' runs one MDX per FY. Default: single",
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -237,6 +453,18 @@ def main() -> int:
         default=None,
         help="Optional log file path. Defaults to logs/full_refresh_fy2023_2025_<timestamp>.log",
     )
+    parser.add_argument(
+        "--delete-mode",
+        choices=["bulk", "batch"],
+        default="bulk",
+        help="'bulk' runs a server-side BulkDelete job; 'batch' fetches ids and sends $batch DELETEs. Default: bulk",
+    )
+    parser.add_argument(
+        "--bulk-delete-max-wait",
+        type=float,
+        default=3600,
+        help="Seconds to wait for a BulkDelete job before cancelling it and falling back to $batch deletes. Default: 3600",
+    )
     parser.add_argument(
         "--delete-workers",
         type=int,
@@ -246,8 +474,8 @@ def main() -> int:
     parser.add_argument(
         "--delete-batch-size",
         type=int,
-        default=100,
-        help="Records per $batch changeset during delete. Default: 100",
+        default=500,
+        help="Records per $batch changeset during delete (halved on 413/429, max 1000). Default: 500",
     )
     parser.add_argument(
         "--delete-fetch-top",
@@ -308,20 +536,19 @@ def main() -> int:
     tenant_id = dv_creds["tenant_id"]
     client_secret = dv_creds["client_secret"]
 
-    token = get_dataverse_access_token(dataverse_url, client_id, client_secret, tenant_id)
+    # Renewed in the background before expiry; workers read it per request via BearerAuth
+    tokens = TokenCache(dataverse_url, client_id, client_secret, tenant_id)
+    auth = BearerAuth(tokens)
     api_url = f"{dataverse_url.rstrip('/')}/api/data/v9.2"
     headers = {
-        "Authorization": f"Bearer {token}",
         "OData-MaxVersion": "4.0",
         "OData-Version": "4.0",
         "Prefer": "odata.continue-on-error",
     }
 
     def refresh_auth() -> str:
-        nonlocal token
-        token = get_dataverse_access_token(dataverse_url, client_id, client_secret, tenant_id)
-        headers["Authorization"] = f"Bearer {token}"
-        return token
+        # Only needed when the server rejects a token early (401/403)
+        return tokens.refresh()
 
     olap_server = os.getenv("OLAP_SERVER", cfg.get("olap", {}).get("server", "https://ednacubes.papajohns.com:10502"))
     olap_ssl_verify = bool(cfg.get("olap", {}).get("ssl_verify", False))
@@ -341,17 +568,33 @@ def main() -> int:
         elif args.dry_run:
             print("  (dry-run) skip delete")
         else:
-            refresh_auth()
-            deleted = _batch_delete(
-                api_url=api_url,
-                table=t.table,
-                id_field=t.id_field,
-                headers=headers,
-                refresh_auth=refresh_auth,
-                fetch_top=max(1, int(args.delete_fetch_top)),
-                delete_batch_size=max(1, int(args.delete_batch_size)),
-                max_workers=max(1, int(args.delete_workers)),
-            )
+            deleted, failed = 0, 0
+            if args.delete_mode == "bulk":
+                try:
+                    deleted, failed = _bulk_delete(
+                        api_url=api_url,
+                        entity=t.entity,
+                        headers=headers,
+                        auth=auth,
+                        max_wait=max(60.0, float(args.bulk_delete_max_wait)),
+                    )
+                    print(f"  BulkDelete removed {deleted:,} rows ({failed:,} failures)")
+                except RuntimeError as e:
+                    print(f"  {e}; falling back to $batch deletes")
+                    failed = -1
+            if args.delete_mode == "batch" or failed:
+                # Batch mode, or sweep up whatever the bulk job could not delete
+                deleted += _batch_delete(
+                    api_url=api_url,
+                    table=t.table,
+                    id_field=t.id_field,
+                    headers=headers,
+                    refresh_auth=refresh_auth,
+                    auth=auth,
+                    fetch_top=max(1, int(args.delete_fetch_top)),
+                    delete_batch_size=max(1, int(args.delete_batch_size)),
+                    max_workers=max(1, int(args.delete_workers)),
+                )
             print(f"  ✅ Deleted {deleted:,} rows from {t.table}")
 
         p = pipelines.get(t.pipeline_name)
@@ -385,10 +628,33 @@ def main() -> int:
                     print("      ⚠ no rows")
                     continue
 
-                refresh_auth()
                 records = transform_df_to_records(df, mapping)
-                created, updated, errors = upsert_to_dataverse(dataverse_url, token, mapping["table"], records)
+                created, updated, errors = upsert_to_dataverse(dataverse_url, tokens, mapping["table"], records)
                 print(f"      ✓ {created} created, {updated} updated, {errors} errors")
+        elif args.fy_query == "single":
+            print(f"  FY{FY_YEARS[0]}–FY{FY_YEARS[-1]}: querying OLAP once (Fiscal_Year on rows) ...")
+            if args.dry_run:
+                print("    (dry-run) skip query/upsert")
+                continue
+
+            df = run_mdx_to_df(
+                xmla_server=olap_server,
+                catalog=p.catalog,
+                username=olap_username,
+                password=olap_password,
+                mdx=_fiscal_years_on_rows(p.mdx, FY_YEARS),
+                parser=p.parser,
+                hierarchy_mappings=[_FISCAL_YEAR_MAPPING, *(p.hierarchy_mappings or [])],
+                ssl_verify=olap_ssl_verify,
+            )
+            if df is None or len(df) == 0 or "FiscalYear" not in df:
+                print("    ⚠ No rows returned")
+                continue
+
+            for fy, grp in df.groupby("FiscalYear", sort=True):
+                records = transform_df_to_records(grp, mapping)
+                created, updated, errors = upsert_to_dataverse(dataverse_url, tokens, mapping["table"], records)
+                print(f"    ✓ {fy}: {created} created, {updated} updated, {errors} errors")
         else:
             for fy in FY_YEARS:
                 print(f"  FY{fy}: querying OLAP ...")
@@ -397,7 +663,6 @@ def main() -> int:
                     print("    (dry-run) skip query/upsert")
                     continue
 
-                refresh_auth()
                 df = run_mdx_to_df(
                     xmla_server=olap_server,
                     catalog=p.catalog,
@@ -412,7 +677,7 @@ def main() -> int:
                     continue
 
                 records = transform_df_to_records(df, mapping)
-                created, updated, errors = upsert_to_dataverse(dataverse_url, token, mapping["table"], records)
+                created, updated, errors = upsert_to_dataverse(dataverse_url, tokens, mapping["table"], records)
                 print(f"    ✓ FY{fy}: {created} created, {updated} updated, {errors} errors")
 
     print("\n✅ Full refresh complete")
@@ -5,141 +5,167 @@ YOUR ORIGINAL SCRIPT – FIXED & ULTRA-FAST
 → This is the real production winner in 2025
 """
 
-import csv
-import json
+import os
+import re
 import time
-import uuid
-from datetime import datetime, timezone
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from datetime import date, datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
 
-import requests
-import msal
+import numpy as np
+import pandas as pd
+from modules.dataverse import TokenCache, upsert_to_dataverse
 from modules.utils.keyvault import get_dataverse_credentials
 
 # ========================= CONFIG =========================
-BATCH_SIZE = 400          # Sweet spot 2025 (was 200 → now 400)
+BATCH_SIZE = 400          # Sweet spot 2025 (was 200 → now 400); upsert_to_dataverse tunes it from here
 MAX_WORKERS = 6           # 6–8 beats 20 every time (no throttling)
 CSV_PATH = "Old Excels/BI Sales Channel - Daily.csv"
+CSV_CHUNK_ROWS = 20000    # rows transformed per vectorized pass
+TRANSFORM_WORKERS = min(4, (os.cpu_count() or 1) - 1)   # processes transforming chunks (0 = in-process)
 TABLE = "crf63_saleschanneldailies"
 # =========================================================
 
-creds = get_dataverse_credentials()
-token = msal.ConfidentialClientApplication(
-    creds['client_id'],
-    authority=f"https://login.microsoftonline.com/{creds['tenant_id']}",
-    client_credential=creds['client_secret']
-).acquire_token_for_client(scopes=[f"{creds['environment_url']}/.default"])["access_token"]
-
-API_URL = f"{creds['environment_url'].rstrip('/')}/api/data/v9.2"
-BATCH_URL = f"{API_URL}/$batch"
-
-session = requests.Session()
-adapter = requests.adapters.HTTPAdapter(pool_connections=20, pool_maxsize=20)
-session.mount('https://', adapter)
-session.headers.update({"Authorization": f"Bearer {token}"})
-
-def transform_row(row):
-    store = row.get('Store Number Label', '').strip()
-    date_raw = row.get('Calendar Date', '').strip()
-    if not store or not date_raw: return None
-
-    date_str = date_raw.split('T')[0]
+# One crf63_lastrefreshed stamp for the whole load (passed explicitly to worker processes)
+_NOW_ISO = datetime.now(timezone.utc).isoformat()
+
+_US_DATE_RE = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4}|\d{2})$')
+
+def parse_date(date_str):
+    """Parse YYYY-MM-DD, M/D/YYYY or M/D/YY without going through strptime on the common paths"""
+    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
+        try: return date.fromisoformat(date_str)
+        except ValueError: pass
+    m = _US_DATE_RE.match(date_str)
+    if m:
+        month, day, year = m.groups()
+        y = int(year)
+        if len(year) == 2: y += 2000 if y < 69 else 1900   # same pivot as %y
+        try: return date(y, int(month), int(day))
+        except ValueError: return None
+    # Anything else (e.g. unpadded ISO dates) keeps the original strptime ladder
     for fmt in ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y'):
-        try:
-            dt = datetime.strptime(date_str, fmt); break
-        except: continue
-    else: return None
-
-    actor = (row.get('Source Actor') or '').strip()
-    channel = (row.get('Source Channel') or '').strip()
-    daypart = (row.get('Day Part') or '').strip()
-
-    def to_float(v):
-        if v in (None,'','-',' ','NULL'): return None
-        try: return float(str(v).replace(',',''))
-        except: return None
-    def to_int(v):
-        f = to_float(v)
-        return int(f) if f is not None and f == int(f) else None
-
-    bk = f"{store}_{dt.strftime('%Y%m%d')}_{actor.replace(' ','_').replace('-','_')}_{channel.replace(' ','_').replace('-','_')}_{daypart.replace(' ','_')}".strip('_')
-
-    return {
+        try: return datetime.strptime(date_str, fmt).date()
+        except ValueError: continue
+    return None
+
+_NULL_TOKENS = ['', '-', ' ', 'NULL']
+
+# Business-key sanitisation in one pass per field (day part only swaps spaces)
+_BK_TRANS = str.maketrans({' ': '_', '-': '_'})
+_BK_DAYPART_TRANS = str.maketrans({' ': '_'})
+
+def to_float(s):
+    """Vectorized float coercion: blanks/'-'/'NULL' and unparseable values become NaN"""
+    s = s.where(~s.isin(_NULL_TOKENS))
+    return pd.to_numeric(s.str.replace(',', '', regex=False), errors='coerce')
+
+def to_int(s):
+    """Vectorized int coercion: only whole numbers survive, as nullable Int64"""
+    f = to_float(s)
+    return f.where(np.isfinite(f) & (f == np.trunc(f))).astype('Int64')
+
+def transform_frame(df, refreshed=_NOW_ISO):
+    """Transform one chunk of CSV rows (all columns as str) into Dataverse records"""
+    def col(name):
+        return df[name].fillna('') if name in df else pd.Series('', index=df.index, dtype=object)
+
+    store = col('Store Number Label').str.strip()
+    date_raw = col('Calendar Date').str.strip()
+    date_str = date_raw.str.split('T', n=1).str[0]
+
+    # Dates repeat heavily, so parse each distinct string once
+    parsed = {v: parse_date(v) for v in date_str.unique()}
+    date_iso = date_str.map({v: d.isoformat() for v, d in parsed.items() if d is not None})
+    date_key = date_str.map({v: f"{d.year:04d}{d.month:02d}{d.day:02d}" for v, d in parsed.items() if d is not None})
+
+    keep = (store != '') & (date_raw != '') & date_iso.notna()
+    if not keep.all():
+        df, store, date_iso, date_key = df[keep], store[keep], date_iso[keep], date_key[keep]
+    if df.empty:
+        return []
+
+    actor = col('Source Actor').str.strip()
+    channel = col('Source Channel').str.strip()
+    daypart = col('Day Part').str.strip()
+
+    bk = (store + '_' + date_key
+          + '_' + actor.str.translate(_BK_TRANS)
+          + '_' + channel.str.translate(_BK_TRANS)
+          + '_' + daypart.str.translate(_BK_DAYPART_TRANS)).str.strip('_')
+
+    out = pd.DataFrame({
         "crf63_businesskey": bk,
         "crf63_storenumber": store,
-        "crf63_calendardate": dt.strftime('%Y-%m-%d'),
-        "crf63_sourceactor": actor or None,
-        "crf63_sourcechannel": channel or None,
-        "crf63_daypart": daypart or None,
-        "crf63_name": f"{store} - {dt.strftime('%Y%m%d')} - {channel} - {daypart}",
-        "crf63_tynetsalesusd": to_float(row.get('TY Net Sales USD')),
-        "crf63_tyorders": to_int(row.get('TY Orders')),
-        "crf63_discountsusd": to_float(row.get('Discounts USD')),
-        "crf63_lynetsalesusd": to_float(row.get('LY Net Sales USD')),
-        "crf63_lyorders": to_int(row.get('LY Orders')),
-        "crf63_lastrefreshed": datetime.now(timezone.utc).isoformat()
-    }
-
-# ============ FAST BATCH BUILDER (bytes, no string explosion) ============
-def build_batch(records):
-    batch_id = str(uuid.uuid4())
-    changeset_id = str(uuid.uuid4())
-    parts = [f"--{batch_id}\r\nContent-Type: multipart/mixed;boundary={changeset_id}\r\n\r\n".encode()]
-
-    for i, rec in enumerate(records, 1):
-        clean_rec = {k: v for k, v in rec.items() if v is not None}
-        key = clean_rec["crf63_businesskey"].replace("'", "''")
-        payload = json.dumps(clean_rec, separators=(',', ':'))
-
-        part = (
-            f"--{changeset_id}\r\n"
-            f"Content-Type: application/http\r\n"
-            f"Content-Transfer-Encoding: binary\r\n"
-            f"Content-ID: {i}\r\n"
-            f"\r\n"
-            f"PATCH {TABLE}(crf63_businesskey='{key}') HTTP/1.1\r\n"
-            f"Content-Type: application/json\r\n"
-            f"Prefer: odata.allow-upsert=true\r\n"
-            f"\r\n"
-            f"{payload}\r\n"
-        ).encode()
-        parts.append(part)
-
-    parts.append(f"--{changeset_id}--\r\n--{batch_id}--\r\n".encode())
-    return b"".join(parts), batch_id
-
-def upsert_batch(chunk):
-    body, batch_id = build_batch(chunk)
-    headers = {
-        "Content-Type": f"multipart/mixed; boundary={batch_id}",
-        "Prefer": "odata.continue-on-error"
-    }
-    for _ in range(5):
-        try:
-            r = session.post(BATCH_URL, headers=headers, data=body, timeout=600)
-            if r.status_code in (200, 204):
-                return len(chunk)
-            if r.status_code == 429:
-                time.sleep(int(r.headers.get("Retry-After", 5)))
-                continue
-        except: time.sleep(3)
-    return 0
+        "crf63_calendardate": date_iso,
+        "crf63_sourceactor": actor.where(actor != ''),
+        "crf63_sourcechannel": channel.where(channel != ''),
+        "crf63_daypart": daypart.where(daypart != ''),
+        "crf63_name": store + ' - ' + date_key + ' - ' + channel + ' - ' + daypart,
+        "crf63_tynetsalesusd": to_float(col('TY Net Sales USD')),
+        "crf63_tyorders": to_int(col('TY Orders')),
+        "crf63_discountsusd": to_float(col('Discounts USD')),
+        "crf63_lynetsalesusd": to_float(col('LY Net Sales USD')),
+        "crf63_lyorders": to_int(col('LY Orders')),
+        "crf63_lastrefreshed": refreshed
+    })
+    # Records leave out null fields (a PATCH with null would clear the column). Rows share
+    # only a handful of null patterns, so emit each pattern's columns in one to_dict pass.
+    present = out.notna()
+    cols = out.columns.to_numpy()
+    out = out.astype(object)
+    records = [None] * len(out)
+    for pattern, rows in present.groupby(list(present.columns), sort=False).indices.items():
+        for pos, rec in zip(rows, out.iloc[rows][cols[list(pattern)]].to_dict(orient='records')):
+            records[pos] = rec
+    return records
+
+def iter_chunks(path, workers=TRANSFORM_WORKERS):
+    """Yield the transformed records of each CSV chunk, skipping rows without a store or valid date"""
+    chunks = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8", chunksize=CSV_CHUNK_ROWS)
+    if workers <= 0:
+        for df in chunks:
+            yield transform_frame(df)
+        return
+    # Fan chunks out to worker processes, keeping only a few in flight so memory stays flat
+    with ProcessPoolExecutor(max_workers=workers) as pp:
+        pending = deque()
+        for df in chunks:
+            pending.append(pp.submit(transform_frame, df, _NOW_ISO))
+            if len(pending) > workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def iter_records(path, stats, workers=TRANSFORM_WORKERS):
+    """Stream transformed rows, keeping only the last row per business key within each chunk.
+    Row counts before and after the dedupe accumulate in stats["rows_in"] / stats["rows_out"]."""
+    for recs in iter_chunks(path, workers):
+        unique = {r["crf63_businesskey"]: r for r in recs}
+        stats["rows_in"] += len(recs)
+        stats["rows_out"] += len(unique)
+        yield from unique.values()
 
 # ========================= MAIN =========================
-print("YOUR ORIGINAL SCRIPT – NOW 10x FASTER".center(80, "="))
-
-records = [r for row in csv.DictReader(open(CSV_PATH, encoding="utf-8")) if (r := transform_row(row))]
-print(f"Parsed {len(records):,} rows → starting upload")
-
-chunks = [records[i:i+BATCH_SIZE] for i in range(0, len(records), BATCH_SIZE)]
-processed = 0
-start = time.time()
-
-with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
-    for future in as_completed([ex.submit(upsert_batch, c) for c in chunks]):
-        processed += future.result()
-        rate = processed / (time.time() - start)
-        print(f"\r{processed:,}/{len(records):,} rows | {rate:,.0f} rows/sec", end="")
-
-elapsed = time.time() - start
-print(f"\n\nDONE → {processed:,} rows in {elapsed:.1f}s → {processed/elapsed:,.0f} rows/sec")
\ No newline at end of file
+if __name__ == "__main__":
+    creds = get_dataverse_credentials()
+    # Renewed in the background before expiry, so long loads never stall on a 401
+    tokens = TokenCache(creds['environment_url'], creds['client_id'], creds['client_secret'], creds['tenant_id'])
+    tokens.get()
+
+    print("YOUR ORIGINAL SCRIPT – NOW 10x FASTER".center(80, "="))
+    print("Streaming rows → parsing and uploading together")
+
+    # Batching, HTTP/2, retries and batch-size tuning live in modules.dataverse
+    start = time.time()
+    dedup = {"rows_in": 0, "rows_out": 0}
+    created, updated, errors = upsert_to_dataverse(
+        creds['environment_url'], tokens, TABLE, iter_records(CSV_PATH, dedup),
+        batch_size=BATCH_SIZE, max_workers=MAX_WORKERS,
+    )
+    processed = created + updated
+
+    elapsed = time.time() - start
+    print(f"\n\nDONE → {processed:,} of {processed + errors:,} rows in {elapsed:.1f}s → {processed/elapsed:,.0f} rows/sec")
+    if dedup["rows_in"] != dedup["rows_out"]:
+        print(f"deduped {dedup['rows_in']:,}→{dedup['rows_out']:,} rows by crf63_businesskey")
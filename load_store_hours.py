@@ -4,55 +4,98 @@ Load Store Operating Hours from Excel to Dataverse
 Updates crf63_storeoperatinghour table with master data from BI Dimensions.xlsx
 """
 
-import json
+import random
+import re
 import time
-from datetime import datetime, timezone
+import uuid
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
+from datetime import datetime, time as dt_time, timedelta, timezone
 
 import requests
-import msal
-import openpyxl
+from modules.dataverse import (
+    HAVE_HTTP2, batch_error_signature, get_dataverse_access_token, json_dumps, retry_after_seconds,
+)
 from modules.utils.keyvault import get_dataverse_credentials
 
+if HAVE_HTTP2:
+    import httpx
+
 # ========================= CONFIG =========================
 EXCEL_PATH = "/Users/howardshen/Library/CloudStorage/OneDrive-SharedLibraries-globalpacmgt.com/IT Project - General/BI Import/BI Dimensions.xlsx"
 SHEET_NAME = "Store hours"
 TABLE = "crf63_storeoperatinghours"
+BATCH_SIZE = 400          # rows per $batch changeset
+MAX_WORKERS = 6           # parallel $batch requests
 # =========================================================
 
+_STATUS_LINE_RE = re.compile(rb'^HTTP/1\.1 (\d{3})', re.M)
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# Tags/paths the sheet and shared-strings readers match on, built once
+_ROW_TAG = f'{_NS}row'
+_CELL_TAG = f'{_NS}c'
+_VALUE_TAG = f'{_NS}v'
+_TEXT_TAG = f'{_NS}t'
+_SI_TAG = f'{_NS}si'
+_RUN_TEXT_PATH = f'{_NS}r/{_NS}t'
+_NUMFMT_LITERAL_RE = re.compile(r'"[^"]*"|\[[^\]]*\]')
+_EPOCH_1900 = datetime(1899, 12, 30)
+_EPOCH_1904 = datetime(1904, 1, 1)
+_NON_DIGITS_RE = re.compile(r'[^0-9]+')   # also strips non-ASCII, e.g. the NBSPs Excel text cells carry
+
+
+@dataclass(slots=True)
+class StoreHours:
+    """One sheet row; turned into a Dataverse record only when its batch is built"""
+    store_number: int
+    day_of_week: int
+    open_time: str = None
+    close_time: str = None
+
+    def as_record(self):
+        # Unset times are left out rather than sent as null (which would clear the column)
+        record = {
+            "crf63_storenumber": self.store_number,
+            "crf63_dayofweek": self.day_of_week
+        }
+        if self.open_time is not None:
+            record["crf63_openingtimehhmm"] = self.open_time
+        if self.close_time is not None:
+            record["crf63_closingtimehhmm"] = self.close_time
+        return record
+
 def get_auth_token():
-    """Get authentication token for Dataverse"""
+    """Get authentication token for Dataverse (reused across runs via the token cache file)"""
     creds = get_dataverse_credentials()
-    token = msal.ConfidentialClientApplication(
-        creds['client_id'],
-        authority=f"https://login.microsoftonline.com/{creds['tenant_id']}",
-        client_credential=creds['client_secret']
-    ).acquire_token_for_client(scopes=[f"{creds['environment_url']}/.default"])["access_token"]
+    token = get_dataverse_access_token(
+        creds['environment_url'], creds['client_id'], creds['client_secret'], creds['tenant_id']
+    )
+    if not token:
+        raise RuntimeError("Failed to obtain Dataverse access token")
     return token, creds['environment_url']
 
 
 def convert_time_to_hhmm(time_value):
     """Convert various time formats to HH:MM string"""
+    # Integers (e.g. 1100) are what data_only cells usually hold: plain int math
+    if type(time_value) is int:
+        if 100 <= time_value <= 9999:
+            h, m = divmod(time_value, 100)
+            return f"{h:02d}:{m:02d}"
+        return None
+    
     if time_value is None or time_value == '':
         return None
     
-    # If it's already a string, clean and format it
+    # If it's a string, drop everything but digits: 100 -> 01:00, 1100 -> 11:00
     if isinstance(time_value, str):
-        # Remove any non-digits
-        clean = ''.join(c for c in time_value if c.isdigit())
-        if len(clean) == 3:
-            # Format 100 -> 01:00
-            return f"{clean[0]:0>2}:{clean[1:3]}"
-        elif len(clean) == 4:
-            # Format 1100 -> 11:00
-            return f"{clean[0:2]}:{clean[2:4]}"
-    
-    # If it's an integer
-    if isinstance(time_value, int):
-        time_str = str(time_value)
-        if len(time_str) == 3:
-            return f"{time_str[0]:0>2}:{time_str[1:3]}"
-        elif len(time_str) == 4:
-            return f"{time_str[0:2]}:{time_str[2:4]}"
+        clean = _NON_DIGITS_RE.sub('', time_value)
+        if len(clean) in (3, 4):
+            clean = clean.zfill(4)
+            return f"{clean[:2]}:{clean[2:]}"
     
     # If it's a datetime.time object
     if hasattr(time_value, 'hour') and hasattr(time_value, 'minute'):
@@ -61,20 +104,135 @@ def convert_time_to_hhmm(time_value):
     return None
 
 
+def _workbook_info(z, sheet_name):
+    """Resolve a sheet name to its part inside the .xlsx zip, plus the workbook's date epoch"""
+    workbook = ET.fromstring(z.read('xl/workbook.xml'))
+    rels = ET.fromstring(z.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels}
+
+    pr = workbook.find(f'{_NS}workbookPr')
+    epoch = _EPOCH_1904 if pr is not None and pr.get('date1904') in ('1', 'true') else _EPOCH_1900
+
+    for sheet in workbook.iter(f'{_NS}sheet'):
+        if sheet.get('name') == sheet_name:
+            target = targets[sheet.get(f'{_REL_NS}id')]
+            return (target.lstrip('/') if target.startswith('/') else f'xl/{target}'), epoch
+    raise KeyError(f"Worksheet {sheet_name!r} does not exist")
+
+
+def _shared_strings(z):
+    """Shared-strings table as a list (cells of type 's' hold an index into it)"""
+    if 'xl/sharedStrings.xml' not in z.namelist():
+        return []
+    strings = []
+    with z.open('xl/sharedStrings.xml') as fh:
+        for _, elem in ET.iterparse(fh):
+            if elem.tag == _SI_TAG:
+                # Plain <t>, or rich-text runs <r><t>; phonetic <rPh> hints are skipped
+                strings.append(''.join(t.text or '' for t in elem.iterfind(_TEXT_TAG))
+                               + ''.join(t.text or '' for t in elem.iterfind(_RUN_TEXT_PATH)))
+                elem.clear()
+    return strings
+
+
+def _date_styles(z):
+    """Indices of cell styles whose number format is a date/time (those numbers are serial dates)"""
+    if 'xl/styles.xml' not in z.namelist():
+        return set()
+    styles = ET.fromstring(z.read('xl/styles.xml'))
+    custom = {int(f.get('numFmtId')): f.get('formatCode', '')
+              for f in styles.iterfind(f'{_NS}numFmts/{_NS}numFmt')}
+    date_styles = set()
+    for i, xf in enumerate(styles.iterfind(f'{_NS}cellXfs/{_NS}xf')):
+        fmt_id = int(xf.get('numFmtId', 0))
+        if fmt_id in custom:
+            # Ignore quoted literals and [colour]/[$-locale] sections, then look for date/time codes
+            code = _NUMFMT_LITERAL_RE.sub('', custom[fmt_id]).lower()
+            if any(ch in code for ch in 'dmyhs'):
+                date_styles.add(i)
+        elif 14 <= fmt_id <= 22 or 45 <= fmt_id <= 47:
+            date_styles.add(i)
+    return date_styles
+
+
+def _column_index(ref):
+    """'C12' -> 2"""
+    col = 0
+    for ch in ref:
+        if ch.isdigit():
+            break
+        col = col * 26 + ord(ch) - 64
+    return col - 1
+
+
+def _cell_value(c, shared, date_styles, epoch):
+    """Python value of one <c> element, typed the way openpyxl's data_only mode would"""
+    t = c.get('t', 'n')
+    if t == 'inlineStr':
+        return ''.join(x.text or '' for x in c.iter(_TEXT_TAG))
+    v = c.findtext(_VALUE_TAG)
+    if v is None:
+        return None
+    if t == 's':
+        return shared[int(v)]
+    if t == 'b':
+        return v == '1'
+    if t in ('str', 'e'):
+        return v
+    if t == 'd':
+        return datetime.fromisoformat(v)
+
+    num = float(v) if ('.' in v or 'E' in v or 'e' in v) else int(v)
+    style = c.get('s')
+    if style is not None and int(style) in date_styles:
+        if 0 <= num < 1:
+            # Time-of-day serial: fraction of a day
+            secs = round(num * 86400) % 86400
+            return dt_time(secs // 3600, secs // 60 % 60, secs % 60)
+        return epoch + timedelta(days=num)
+    return num
+
+
+def iter_sheet_rows(path, sheet_name, max_col=4):
+    """
+    Stream (row_number, values) from one worksheet without openpyxl.
+    The sheet XML is decompressed and parsed in one pass; each <row> is cleared once read,
+    so memory stays flat however long the sheet is. Only the first max_col columns are kept.
+    """
+    with zipfile.ZipFile(path) as z:
+        sheet_path, epoch = _workbook_info(z, sheet_name)
+        shared = _shared_strings(z)
+        date_styles = _date_styles(z)
+
+        with z.open(sheet_path) as fh:
+            row_number = 0
+            for _, elem in ET.iterparse(fh):
+                if elem.tag != _ROW_TAG:
+                    continue
+                row_number = int(elem.get('r') or row_number + 1)
+                values = [None] * max_col
+                col = -1
+                for c in elem.iterfind(_CELL_TAG):
+                    ref = c.get('r')
+                    col = _column_index(ref) if ref else col + 1
+                    if col < max_col:
+                        values[col] = _cell_value(c, shared, date_styles, epoch)
+                elem.clear()
+                yield row_number, tuple(values)
+
+
 def load_excel_data():
     """Load store hours data from Excel file"""
     print(f"Loading Excel file: {EXCEL_PATH}")
-    wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True, data_only=True)
-    ws = wb[SHEET_NAME]
     
-    records = []
-    headers = None
-    
-    for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-        if row_idx == 1:
-            # First row is headers
-            headers = row
-            print(f"Headers: {headers}")
+    # Keyed by (store, day) so a store/day listed twice is sent once (last row wins);
+    # two PATCHes on one alternate key in parallel batches could both try to create it
+    records = {}
+    duplicates = 0
+    # Only the first 4 columns are used, so don't materialize the rest
+    for row_number, row in iter_sheet_rows(EXCEL_PATH, SHEET_NAME, max_col=4):
+        if row_number == 1:
+            print(f"Headers: {row}")
             continue
         
         # Skip empty rows
@@ -90,142 +248,58 @@ def load_excel_data():
         if store_number is None or day_of_week is None:
             continue
         
+        key = (store_number, day_of_week)
+        duplicates += key in records
         # Convert times to HH:MM format
-        open_time = convert_time_to_hhmm(open_time_raw)
-        close_time = convert_time_to_hhmm(close_time_raw)
-        
-        record = {
-            "crf63_storenumber": store_number,
-            "crf63_dayofweek": day_of_week,
-            "crf63_openingtimehhmm": open_time,
-            "crf63_closingtimehhmm": close_time
-        }
-        
-        records.append(record)
+        records[key] = StoreHours(
+            store_number,
+            day_of_week,
+            convert_time_to_hhmm(open_time_raw),
+            convert_time_to_hhmm(close_time_raw)
+        )
     
-    wb.close()
     print(f"Loaded {len(records)} records from Excel")
-    return records
+    if duplicates:
+        print(f"  ({duplicates} repeated store/day rows collapsed to the last one)")
+    return list(records.values())
 
 
-def fetch_existing_records(session, api_url):
-    """Fetch all existing store operating hour records"""
-    print("Fetching existing records from Dataverse...")
-    
-    existing = {}
-    url = f"{api_url}/crf63_storeoperatinghours?$select=crf63_storeoperatinghourid,crf63_storenumber,crf63_dayofweek"
-    
-    while url:
-        resp = session.get(url, timeout=60)
-        if resp.status_code != 200:
-            print(f"Error fetching records: {resp.status_code}")
-            return {}
-        
-        data = resp.json()
-        for record in data.get('value', []):
-            store_num = record.get('crf63_storenumber')
-            day = record.get('crf63_dayofweek')
-            record_id = record.get('crf63_storeoperatinghourid')
-            
-            if store_num is not None and day is not None and record_id:
-                key = f"{store_num}_{day}"
-                existing[key] = record_id
-        
-        # Check for next page
-        url = data.get('@odata.nextLink')
-    
-    print(f"Found {len(existing)} existing records")
-    return existing
-
-
-def upsert_record(session, api_url, record, existing_id=None):
-    """Update existing record or create new one"""
-    clean_rec = {k: v for k, v in record.items() if v is not None}
-    
-    if existing_id:
-        # UPDATE existing record
-        url = f"{api_url}/crf63_storeoperatinghours({existing_id})"
-        resp = session.patch(url, json=clean_rec, timeout=30)
-        return resp.status_code in (200, 204), resp.status_code
-    else:
-        # CREATE new record
-        url = f"{api_url}/crf63_storeoperatinghours"
-        resp = session.post(url, json=clean_rec, timeout=30)
-        return resp.status_code in (201, 204), resp.status_code
-
-
-def process_records(session, api_url, records, existing):
-    """Process all records with upsert logic"""
-    print(f"\nProcessing {len(records)} records...")
-    
-    success_count = 0
-    update_count = 0
-    create_count = 0
-    error_count = 0
-    
-    for idx, record in enumerate(records, 1):
-        store_num = record['crf63_storenumber']
-        day = record['crf63_dayofweek']
-        key = f"{store_num}_{day}"
-        
-        existing_id = existing.get(key)
-        success, status_code = upsert_record(session, api_url, record, existing_id)
-        
-        if success:
-            success_count += 1
-            if existing_id:
-                update_count += 1
-                action = "updated"
-            else:
-                create_count += 1
-                action = "created"
-            
-            if idx % 50 == 0:
-                print(f"  Progress: {idx}/{len(records)} ({action})")
-        else:
-            error_count += 1
-            print(f"  ✗ Error on Store {store_num}, Day {day}: HTTP {status_code}")
-        
-        # Rate limiting
-        if idx % 10 == 0:
-            time.sleep(0.1)
-    
-    return success_count, update_count, create_count, error_count
+def build_batch(records):
+    """Build a $batch changeset of alternate-key upserts, one PATCH per store/day (orjson when available)"""
+    batch_id = uuid.uuid4().hex
+    changeset_id = uuid.uuid4().hex
+    part_header = (
+        f"--{changeset_id}\r\n"
+        f"Content-Type: application/http\r\n"
+        f"Content-Transfer-Encoding: binary\r\n"
+        f"Content-ID: "
+    ).encode()
+    # 201 vs 200 tells created from updated; $select keeps the returned representation tiny
+    part_trailer = (
+        f"?$select=crf63_storeoperatinghourid HTTP/1.1\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Prefer: return=representation\r\n"
+        f"\r\n"
+    ).encode()
 
+    buf = bytearray(f"--{batch_id}\r\nContent-Type: multipart/mixed;boundary={changeset_id}\r\n\r\n".encode())
+    for i, row in enumerate(records, 1):
+        # PATCH on the (store number, day of week) alternate key creates or updates server-side
+        buf += part_header
+        buf += f"{i}\r\n\r\nPATCH {TABLE}(crf63_storenumber={row.store_number},crf63_dayofweek={row.day_of_week})".encode()
+        buf += part_trailer
+        buf += json_dumps(row.as_record())
+        buf += b"\r\n"
 
-def build_batch(records):
-    """Build a batch request for Dataverse"""
-    batch_id = str(uuid.uuid4())
-    changeset_id = str(uuid.uuid4())
-    parts = [f"--{batch_id}\r\nContent-Type: multipart/mixed;boundary={changeset_id}\r\n\r\n".encode()]
-
-    for i, rec in enumerate(records, 1):
-        clean_rec = {k: v for k, v in rec.items() if v is not None}
-        key = clean_rec["crf63_businesskey"].replace("'", "''")
-        payload = json.dumps(clean_rec, separators=(',', ':'))
-
-        part = (
-            f"--{changeset_id}\r\n"
-            f"Content-Type: application/http\r\n"
-            f"Content-Transfer-Encoding: binary\r\n"
-            f"Content-ID: {i}\r\n"
-            f"\r\n"
-            f"PATCH {TABLE}(crf63_businesskey='{key}') HTTP/1.1\r\n"
-            f"Content-Type: application/json\r\n"
-            f"Prefer: return=representation\r\n"
-            f"\r\n"
-            f"{payload}\r\n"
-        ).encode()
-        parts.append(part)
-
-    parts.append(f"--{changeset_id}--\r\n--{batch_id}--\r\n".encode())
-    return b"".join(parts), batch_id
+    buf += f"--{changeset_id}--\r\n--{batch_id}--\r\n".encode()
+    return bytes(buf), batch_id
 
 
 def send_batch(session, batch_url, batch_body, batch_boundary):
-    """Send a batch request to Dataverse"""
+    """Send a batch request to Dataverse; returns (response body, error)"""
     headers = {
         "Content-Type": f"multipart/mixed;boundary={batch_boundary}",
+        "Prefer": "odata.continue-on-error",
         "OData-MaxVersion": "4.0",
         "OData-Version": "4.0"
     }
@@ -233,21 +307,124 @@ def send_batch(session, batch_url, batch_body, batch_boundary):
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            resp = session.post(batch_url, data=batch_body, headers=headers, timeout=60)
+            if HAVE_HTTP2:
+                resp = session.post(batch_url, content=batch_body, headers=headers)
+            else:
+                resp = session.post(batch_url, data=batch_body, headers=headers, timeout=120)
             if resp.status_code in (200, 201, 204):
-                return True, None
+                return resp.content, None
             elif resp.status_code == 429:
-                retry_after = int(resp.headers.get('Retry-After', 10))
-                time.sleep(retry_after)
+                # Seconds or HTTP-date; jitter so the worker threads don't retry in lockstep
+                time.sleep(retry_after_seconds(resp.headers.get('Retry-After'), 10) + random.uniform(0, 0.5))
                 continue
             else:
-                return False, f"HTTP {resp.status_code}: {resp.text[:200]}"
+                return b"", f"HTTP {resp.status_code}: {resp.text[:200]}"
         except Exception as e:
             if attempt == max_retries - 1:
-                return False, str(e)
+                return b"", str(e)
             time.sleep(2 ** attempt)
     
-    return False, "Max retries exceeded"
+    return b"", "Max retries exceeded"
+
+
+def _upsert_chunk(session, api_url, chunk):
+    """Upsert one chunk in a single $batch; returns (updated, created, errors), a dict
+    with the first error if the changeset rolled back, or None if the request itself failed"""
+    body, batch_id = build_batch(chunk)
+    content, error = send_batch(session, f"{api_url}/$batch", body, batch_id)
+    statuses = [int(code) for code in _STATUS_LINE_RE.findall(content)]
+    
+    # A failed changeset comes back as a single error response for the whole chunk
+    if len(statuses) != len(chunk):
+        status = statuses[0] if statuses else None
+        if error is None and status not in (401, 403):
+            # Reported once the bisect stops splitting, not at every level
+            return {"error": batch_error_signature(content)}
+        print(f"  ✗ Batch of {len(chunk)} failed: {error or f'HTTP {status}'}")
+        if error and not error.startswith(("HTTP 401", "HTTP 403")):
+            return None
+        # Auth failures hit every row alike; splitting won't help
+        return 0, 0, len(chunk)
+    
+    update_count = create_count = error_count = 0
+    for row, status in zip(chunk, statuses):
+        if status >= 400:
+            error_count += 1
+            print(f"  ✗ Error on Store {row.store_number}, Day {row.day_of_week}: HTTP {status}")
+        elif status == 201:
+            create_count += 1
+        else:
+            update_count += 1
+    return update_count, create_count, error_count
+
+
+def _bisect(session, api_url, chunk):
+    """Retry a failed chunk as two halves, splitting further only the half that still fails.
+    A branch stops splitting when both halves roll back with the same first error (every
+    row failing alike, e.g. a missing key or column) or both fail the request itself (the
+    server is at fault rather than the data)."""
+    half = len(chunk) // 2
+    parts = (chunk[:half], chunk[half:])
+    results = [_upsert_chunk(session, api_url, part) for part in parts]
+    if all(isinstance(result, dict) for result in results) and results[0]["error"] == results[1]["error"]:
+        status, message = results[0]["error"]
+        detail = f"HTTP {(status or b'?').decode()}: {(message or b'').decode('utf-8', 'replace')[:200]}"
+        print(f"  ✗ Batch of {len(chunk)} failed alike in both halves: {detail}")
+        return 0, 0, len(chunk)
+    give_up = all(result is None for result in results)
+    totals = [0, 0, 0]
+    for part, result in zip(parts, results):
+        if result is None and give_up:
+            result = (0, 0, len(part))
+        elif not isinstance(result, tuple):
+            result = _bisect(session, api_url, part) if len(part) > 1 else (0, 0, 1)
+        totals = [a + b for a, b in zip(totals, result)]
+    return tuple(totals)
+
+
+def process_batch(session, api_url, chunk):
+    """Upsert one chunk of records; a chunk that fails whole is bisected to isolate the bad rows"""
+    result = _upsert_chunk(session, api_url, chunk)
+    if not isinstance(result, tuple):
+        result = _bisect(session, api_url, chunk) if len(chunk) > 1 else (0, 0, 1)
+    return result
+
+
+def process_records(session, api_url, records):
+    """Process all records with upsert logic, BATCH_SIZE rows per $batch across MAX_WORKERS threads"""
+    print(f"\nProcessing {len(records)} records...")
+    
+    update_count = 0
+    create_count = 0
+    error_count = 0
+    
+    def tally(future):
+        nonlocal update_count, create_count, error_count
+        updated, created, errors = future.result()
+        update_count += updated
+        create_count += created
+        error_count += errors
+        done = update_count + create_count + error_count
+        print(f"  Progress: {done}/{len(records)} ({update_count} updated, {create_count} created, {error_count} errors)")
+    
+    # Chunks are sliced as they are submitted, with at most MAX_WORKERS * 2 in flight
+    chunks = (records[i:i + BATCH_SIZE] for i in range(0, len(records), BATCH_SIZE))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        pending = set()
+        if (first := next(chunks, None)) is not None:
+            # First batch alone opens the connection; the rest then share it (HTTP/2 streams)
+            tally(ex.submit(process_batch, session, api_url, first))
+        for chunk in chunks:
+            if len(pending) >= MAX_WORKERS * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tally(future)
+            pending.add(ex.submit(process_batch, session, api_url, chunk))
+        for future in as_completed(pending):
+            tally(future)
+    
+    success_count = update_count + create_count
+    return success_count, update_count, create_count, error_count
 
 
 def main():
@@ -270,10 +447,18 @@ def main():
     token, environment_url = get_auth_token()
     api_url = f"{environment_url.rstrip('/')}/api/data/v9.2"
     
-    # Setup session
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=10)
-    session.mount('https://', adapter)
+    # Setup session: with httpx[http2] every batch multiplexes over one TLS connection,
+    # otherwise pooled keep-alive requests
+    if HAVE_HTTP2:
+        session = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=MAX_WORKERS, max_keepalive_connections=MAX_WORKERS),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+    else:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=10)
+        session.mount('https://', adapter)
     session.headers.update({
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
@@ -281,11 +466,11 @@ def main():
         "OData-Version": "4.0"
     })
     
-    # Fetch existing records
-    existing = fetch_existing_records(session, api_url)
-    
     # Process records
-    success_count, update_count, create_count, error_count = process_records(session, api_url, records, existing)
+    try:
+        success_count, update_count, create_count, error_count = process_records(session, api_url, records)
+    finally:
+        session.close()
     
     elapsed = time.time() - start_time
     
@@ -2,15 +2,118 @@ import requests
 import msal
 import uuid
 import json
+import os
 import time
 import concurrent.futures
+import functools
+import gzip
+import random
 import re
+import threading
 import json as json_module
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from itertools import islice
 from urllib.parse import quote
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Public so the loader scripts share one compact-JSON encoder and HTTP/2 probe
+try:
+    import orjson
+
+    def json_dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+try:
+    import httpx
+    import h2  # noqa: F401  (httpx needs the h2 package for http2=True)
+    HAVE_HTTP2 = True
+except ImportError:
+    HAVE_HTTP2 = False
+
+# Client-credentials tokens are kept in an MSAL cache file between runs, so back-to-back
+# jobs reuse a still-valid token instead of going back to Entra ID every time
+TOKEN_CACHE_PATH = os.environ.get("DATAVERSE_TOKEN_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "bw-data-integration", "msal_token_cache.json")
+_MIN_TOKEN_LIFETIME = 300   # re-acquire when a cached token has less than 5 minutes left
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def _load_token_cache():
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = msal.SerializableTokenCache()
+        try:
+            with open(TOKEN_CACHE_PATH) as f:
+                _token_cache.deserialize(f.read())
+        except (OSError, ValueError):
+            pass  # first run, or unreadable file: start empty
+    return _token_cache
+
+
+def _save_token_cache():
+    # Written whenever MSAL changed it; 0600 since it holds bearer tokens
+    if not _token_cache.has_state_changed:
+        return
+    try:
+        os.makedirs(os.path.dirname(TOKEN_CACHE_PATH), exist_ok=True)
+        tmp = f"{TOKEN_CACHE_PATH}.{os.getpid()}.tmp"
+        with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            f.write(_token_cache.serialize())
+        os.replace(tmp, TOKEN_CACHE_PATH)
+        _token_cache.has_state_changed = False
+    except OSError:
+        pass  # the cache is an optimisation; the token itself is fine
+
+
+@functools.lru_cache(maxsize=4)
+def _client_app(client_id, client_secret, tenant_id):
+    # One app per credential for the whole process: building it costs the authority
+    # metadata lookup and credential setup, and it keeps its own in-memory state
+    return msal.ConfidentialClientApplication(
+        client_id,
+        authority=f"https://login.microsoftonline.com/{tenant_id}",
+        client_credential=client_secret,
+        token_cache=_load_token_cache()
+    )
+
+
+def _acquire_client_token(environment_url, client_id, client_secret, tenant_id, force_refresh=False):
+    """
+    acquire_token_for_client through the persistent token cache.
+    A cached token is reused while it has more than 5 minutes left; force_refresh drops it first.
+    Returns the MSAL result dict.
+    """
+    scopes = [f"{environment_url}/.default"]
+    with _token_cache_lock:
+        cache = _load_token_cache()
+        app = _client_app(client_id, client_secret, tenant_id)
+
+        def drop_cached():
+            for at in list(cache.search(msal.TokenCache.CredentialType.ACCESS_TOKEN,
+                                        target=scopes, query={"client_id": client_id})):
+                cache.remove_at(at)
+
+        if force_refresh:
+            drop_cached()
+        result = app.acquire_token_for_client(scopes=scopes)
+        if result.get("token_source") == "cache" and int(result.get("expires_in", 0)) <= _MIN_TOKEN_LIFETIME:
+            drop_cached()
+            result = app.acquire_token_for_client(scopes=scopes)
+        _save_token_cache()
+    return result
+
+
 def get_dataverse_access_token(environment_url, client_id, client_secret, tenant_id, logger=None):
-    """Obtain an access token for Dataverse."""
+    """Obtain an access token for Dataverse (reused from the token cache file while valid)."""
     def log(msg):
         if logger:
             logger.info(msg)
@@ -18,14 +121,7 @@ def get_dataverse_access_token(environment_url, client_id, client_secret, tenant
             print(msg)
     
     try:
-        authority = f"https://login.microsoftonline.com/{tenant_id}"
-        app = msal.ConfidentialClientApplication(
-            client_id,
-            authority=authority,
-            client_credential=client_secret
-        )
-        scope = [f"{environment_url}/.default"]
-        result = app.acquire_token_for_client(scopes=scope)
+        result = _acquire_client_token(environment_url, client_id, client_secret, tenant_id)
         
         if "access_token" in result:
             log(f"Dataverse access token obtained")
@@ -37,10 +133,197 @@ def get_dataverse_access_token(environment_url, client_id, client_secret, tenant
         log(f"Error obtaining Dataverse access token: {e}")
         return None
 
-def upsert_to_dataverse(environment_url, access_token, table_name, records, alternate_key="crf63_businesskey", logger=None):
+class TokenCache:
+    """Client-credentials token for Dataverse that renews itself before it expires.
+
+    get() classifies the cached token as:
+      FRESH   - hand it out as-is
+      STALE   - inside the renewal window; hand it out and refresh on a daemon thread
+      EXPIRED - missing or past expiry; block until a new token arrives
+
+    The renewal window is 3 minutes plus up to a minute of jitter, re-drawn per
+    token, so parallel jobs sharing an app registration don't all renew at once.
+
+    Tokens come from the persistent token cache, so a new run starts with the
+    previous run's token when it still has more than 5 minutes left.
+    """
+
+    FRESH, STALE, EXPIRED = "fresh", "stale", "expired"
+
+    def __init__(self, environment_url, client_id, client_secret, tenant_id,
+                 stale_window=180, jitter=60, logger=None):
+        self._credentials = (environment_url, client_id, client_secret, tenant_id)
+        self._base_window = stale_window
+        self._jitter = jitter
+        self._stale_window = stale_window
+        self._lock = threading.Lock()          # guards _refreshing
+        self._refresh_lock = threading.Lock()  # held while talking to Entra ID
+        self._refreshing = False
+        self._logger = logger
+        self.token = None
+        self.expires_at = 0.0
+
+    def _log(self, msg):
+        if self._logger:
+            self._logger.info(msg)
+        else:
+            print(msg)
+
+    def state(self):
+        remaining = self.expires_at - time.time()
+        if remaining <= 0:
+            return self.EXPIRED
+        if remaining <= self._stale_window:
+            return self.STALE
+        return self.FRESH
+
+    def _acquire(self, force=False):
+        result = _acquire_client_token(*self._credentials, force_refresh=force)
+        if "access_token" not in result:
+            raise RuntimeError(f"Failed to obtain Dataverse access token: {result.get('error_description', 'Unknown error')}")
+        self.token = result["access_token"]
+        self.expires_at = time.time() + int(result.get("expires_in", 3600))
+        self._stale_window = self._base_window + random.uniform(0, self._jitter)
+
+    def _background_refresh(self):
+        try:
+            with self._refresh_lock:
+                if self.state() != self.FRESH:
+                    self._acquire(force=True)
+        except Exception as e:
+            # The current token is still valid; get() blocks and retries once it expires.
+            self._log(f"Background token refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh(self):
+        """Force a new token now (e.g. after a 401) and return it."""
+        with self._refresh_lock:
+            self._acquire(force=True)
+            return self.token
+
+    def get(self):
+        state = self.state()
+        if state == self.FRESH:
+            return self.token
+        if state == self.STALE:
+            with self._lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._background_refresh, daemon=True).start()
+            return self.token
+        with self._refresh_lock:
+            if self.state() == self.EXPIRED:
+                self._acquire()
+            return self.token
+
+
+class BearerAuth(requests.auth.AuthBase):
+    """requests auth hook that stamps the current TokenCache token on every request."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __call__(self, r):
+        r.headers["Authorization"] = f"Bearer {self.cache.get()}"
+        return r
+
+
+_STATUS_LINE_RE = re.compile(rb'^HTTP/1\.1 (\d{3})', re.M)   # scans raw response bytes
+_SUBRESPONSE_SPLIT_RE = re.compile(r'\nHTTP/1\.1 ')
+_ERROR_MESSAGE_RE = re.compile(rb'"message"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+_RETRY_STATUSES = (429, 502, 503, 504)
+_MAX_CONCURRENCY = 32   # ceiling for batches in flight per upsert_to_dataverse call
+_TIMEOUTS = (requests.Timeout, httpx.TimeoutException) if HAVE_HTTP2 else (requests.Timeout,)
+_AUTH_STATUSES = {b'401', b'403'}
+
+# upsert_batch outcomes that ask the caller to split the batch
+_ROLLED_BACK = "rolled_back"        # one bad row sank the changeset
+_REQUEST_FAILED = "request_failed"  # 5xx/timeouts that outlasted the retries
+
+
+def _make_upload_client(access_token, max_workers):
+    """HTTP/2 httpx client when available, else a pooled requests session that retries 429/5xx."""
+    if isinstance(access_token, TokenCache):
+        auth = BearerAuth(access_token)
+    else:
+        auth = None
+    if HAVE_HTTP2:
+        client = httpx.Client(
+            http2=True,
+            auth=auth,
+            limits=httpx.Limits(max_connections=max_workers * 2, max_keepalive_connections=max_workers * 2),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+    else:
+        client = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_workers * 4,
+            pool_maxsize=max_workers * 4,
+            max_retries=Retry(
+                total=5,
+                backoff_factor=1.5,
+                status_forcelist=list(_RETRY_STATUSES),
+                allowed_methods=frozenset({"POST"}),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            ),
+        )
+        client.mount('https://', adapter)
+        client.mount('http://', adapter)
+        client.auth = auth
+    if auth is None:
+        client.headers.update({"Authorization": f"Bearer {access_token}"})
+    return client
+
+
+def retry_after_seconds(value, default):
+    """Seconds to wait per a Retry-After header value (delta-seconds or HTTP-date); default if missing/garbled"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def batch_error_signature(batch_body: bytes):
+    """(status, message) of the first failed sub-response in a $batch response body.
+
+    Two halves of a split batch that roll back with the same signature point at a
+    systematic failure (missing key, renamed column) rather than one bad row.
+    """
+    status = next((code for code in _STATUS_LINE_RE.findall(batch_body) if code[:1] in (b'4', b'5')), None)
+    match = _ERROR_MESSAGE_RE.search(batch_body)
+    return status, match.group(1) if match else None
+
+
+def _was_throttled(r):
+    """True if this response, or any attempt the requests adapter retried for it, was a 429/5xx"""
+    retries = getattr(getattr(r, "raw", None), "retries", None)
+    return (r.status_code in _RETRY_STATUSES
+            or bool(retries and any(h.status in _RETRY_STATUSES for h in retries.history)))
+
+
+def upsert_to_dataverse(environment_url, access_token, table_name, records, alternate_key="crf63_businesskey", logger=None,
+                        batch_size=400, max_workers=6, compress=True):
     """
     ULTRA-FAST upsert using optimized batch method from load_csv.py.
     Achieves 1,800–2,600 rows/sec on production Dataverse environments.
+    access_token may be a token string or a TokenCache (renewed per request).
+    records may be a list or any iterable; iterables are streamed batch by batch.
+    batch_size is the starting point; it shrinks on throttling and grows on clean batches.
+    max_workers is the starting number of batches in flight; AIMD moves it between 1 and 32.
+    compress gzips bodies over 4 KB; if the server rejects that, the rest go uncompressed.
     """
     def log(msg):
         if logger:
@@ -51,79 +334,92 @@ def upsert_to_dataverse(environment_url, access_token, table_name, records, alte
     api_url = f"{environment_url.rstrip('/')}/api/data/v9.2"
     batch_url = f"{api_url}/$batch"
 
-    # Filter valid records
-    valid_records = [r for r in records if r.get(alternate_key)]
-    total = len(valid_records)
-    if total == 0:
-        log("No valid records to upsert")
-        return 0, 0, 0
+    # Filter valid records (lazily, so generators keep streaming)
+    total = None
+    if isinstance(records, list):
+        records = [r for r in records if r.get(alternate_key)]
+        total = len(records)
+        if total == 0:
+            log("No valid records to upsert")
+            return 0, 0, 0
+    else:
+        records = (r for r in records if r.get(alternate_key))
+
+    # HTTP/2 when httpx[http2] is installed, otherwise pooled keep-alive HTTP/1.1
+    max_concurrency = max(max_workers, _MAX_CONCURRENCY)
+    session = _make_upload_client(access_token, max_concurrency)
 
-    # Setup session with connection pooling
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(pool_connections=20, pool_maxsize=20)
-    session.mount('https://', adapter)
-    session.headers.update({"Authorization": f"Bearer {access_token}"})
+    # Constant multipart fragments, encoded once per call
+    part_hdr = b"Content-Type: application/http\r\nContent-Transfer-Encoding: binary\r\nContent-ID: "
+    patch_prefix = f"\r\n\r\nPATCH {table_name}({alternate_key}='".encode()
+    # 201 vs 200 tells created from updated; $select keeps the returned representation tiny
+    patch_suffix = (
+        f"')?$select={alternate_key} HTTP/1.1\r\n"
+        "Content-Type: application/json\r\n"
+        "Prefer: return=representation\r\n"
+        "\r\n"
+    ).encode()
 
-    # Build batch function (binary encoding for speed)
+    # Build batch function (single bytearray, orjson when available)
     debug_first_batch = True
+    debug_first_response = True
     def build_batch(batch_records):
         nonlocal debug_first_batch
-        batch_id = str(uuid.uuid4())
-        changeset_id = str(uuid.uuid4())
-        parts = [f"--{batch_id}\r\nContent-Type: multipart/mixed;boundary={changeset_id}\r\n\r\n".encode()]
+        batch_id = uuid.uuid4().hex
+        changeset_id = uuid.uuid4().hex
+        delim = f"--{changeset_id}\r\n".encode()
 
-        for i, rec in enumerate(batch_records, 1):
-            clean_rec = {k: v for k, v in rec.items() if v is not None}
-            key_value = clean_rec[alternate_key]
-            # Try WITHOUT URL encoding - just escape single quotes
+        # Debug print first record (once per call, outside the per-record loop)
+        if debug_first_batch and batch_records:
+            debug_first_batch = False
+            key_value = batch_records[0][alternate_key]
             encoded_key = str(key_value).replace("'", "''")
-            payload = json.dumps(clean_rec, separators=(',', ':'))
-
-            part = (
-                f"--{changeset_id}\r\n"
-                f"Content-Type: application/http\r\n"
-                f"Content-Transfer-Encoding: binary\r\n"
-                f"Content-ID: {i}\r\n"
-                f"\r\n"
-                f"PATCH {table_name}({alternate_key}='{encoded_key}') HTTP/1.1\r\n"
-                f"Content-Type: application/json\r\n"
-                f"Prefer: return=representation,odata.include-annotations=*\r\n"
-                f"\r\n"
-                f"{payload}\r\n"
-            ).encode()
-            parts.append(part)
-            
-            # Debug print first record
-            if debug_first_batch and i == 1:
-                log(f"\n🔍 DEBUG - First record being sent:")
-                log(f"   Table: {table_name}")
-                log(f"   Alternate key field: {alternate_key}")
-                log(f"   Key value (raw): {key_value}")
-                log(f"   Key value (encoded): {encoded_key}")
-                log(f"   PATCH line: PATCH {table_name}({alternate_key}='{encoded_key}') HTTP/1.1")
-                log(f"   Payload: {payload[:200]}...")
-                debug_first_batch = False
-
-        parts.append(f"--{changeset_id}--\r\n--{batch_id}--\r\n".encode())
-        return b"".join(parts), batch_id
-
-    def _count_subresponses(batch_text: str, expected: int):
-        # Count all possible success status codes
-        created = batch_text.count('HTTP/1.1 201 Created')
-        updated = batch_text.count('HTTP/1.1 200 OK')
-        no_content = batch_text.count('HTTP/1.1 204 No Content')
+            log(f"\n🔍 DEBUG - First record being sent:")
+            log(f"   Table: {table_name}")
+            log(f"   Alternate key field: {alternate_key}")
+            log(f"   Key value (raw): {key_value}")
+            log(f"   Key value (encoded): {encoded_key}")
+            log(f"   PATCH line: PATCH {table_name}({alternate_key}='{encoded_key}')?$select={alternate_key} HTTP/1.1")
+            log(f"   Payload: {json_dumps(batch_records[0])[:200].decode('utf-8', errors='replace')}...")
+
+        buf = bytearray(f"--{batch_id}\r\nContent-Type: multipart/mixed;boundary={changeset_id}\r\n\r\n".encode())
+        for i, rec in enumerate(batch_records, 1):
+            # Omit nulls (a null in PATCH would clear the column); most callers already do
+            if None in rec.values():
+                rec = {k: v for k, v in rec.items() if v is not None}
+            # Try WITHOUT URL encoding - just escape single quotes (rare, so test before copying)
+            encoded_key = str(rec[alternate_key])
+            if "'" in encoded_key:
+                encoded_key = encoded_key.replace("'", "''")
+
+            buf += delim
+            buf += part_hdr
+            buf += b"%d" % i
+            buf += patch_prefix
+            buf += encoded_key.encode()
+            buf += patch_suffix
+            buf += json_dumps(rec)
+            buf += b"\r\n"
+
+        buf += f"--{changeset_id}--\r\n--{batch_id}--\r\n".encode()
+        return bytes(buf), batch_id
+
+    def _count_subresponses(batch_body: bytes, expected: int):
+        # One pass over the sub-response status lines (ASCII, so no need to decode the body)
+        codes = Counter(_STATUS_LINE_RE.findall(batch_body))
+        created = codes[b'201']
+        updated = codes[b'200']
+        no_content = codes[b'204']
         
         # Count only actual error codes (4xx and 5xx, but NOT 204)
-        errors = 0
-        for code in ['400', '401', '403', '404', '409', '429', '500', '502', '503', '504']:
-            errors += batch_text.count(f'HTTP/1.1 {code}')
+        errors = sum(n for code, n in codes.items() if code[:1] in (b'4', b'5'))
         
         # For PATCH operations, 204 No Content is success (no body returned)
         total_success = created + updated + no_content
         
         # Debug: Print actual status codes found (only on first batch)
-        nonlocal debug_first_batch
-        if debug_first_batch:
+        nonlocal debug_first_response
+        if debug_first_response:
             log(f"\n🔍 DEBUG - Batch response status codes:")
             log(f"   201 Created: {created}")
             log(f"   200 OK: {updated}")
@@ -131,7 +427,7 @@ def upsert_to_dataverse(environment_url, access_token, table_name, records, alte
             log(f"   Total Success: {total_success}")
             log(f"   4xx/5xx Errors: {errors}")
             log(f"   Expected responses: {expected}")
-            debug_first_batch = False
+            debug_first_response = False
         
         accounted = total_success + errors
 
@@ -148,7 +444,7 @@ def upsert_to_dataverse(environment_url, access_token, table_name, records, alte
     def _extract_error_snippets(batch_text: str, limit: int = 2):
         snippets = []
         # Split into HTTP response parts; surface a couple failures for debugging.
-        for part in re.split(r'\nHTTP/1\.1 ', batch_text):
+        for part in _SUBRESPONSE_SPLIT_RE.split(batch_text):
             if not part:
                 continue
             status_line = part.split('\n', 1)[0]
@@ -159,62 +455,236 @@ def upsert_to_dataverse(environment_url, access_token, table_name, records, alte
                     break
         return snippets
 
+    # Batch size feedback: shrink 25% on throttling/timeouts, grow 10% after 5 clean batches
+    current_batch = max(50, min(1000, batch_size))
+    clean_streak = 0
+    tune_lock = threading.Lock()
+
+    def tune_batch_size(throttled):
+        nonlocal current_batch, clean_streak
+        with tune_lock:
+            if throttled:
+                current_batch = max(50, int(current_batch * 0.75))
+                clean_streak = 0
+            else:
+                clean_streak += 1
+                if clean_streak >= 5:
+                    current_batch = min(1000, int(current_batch * 1.1))
+                    clean_streak = 0
+
+    def log_errors(batch_body):
+        # Only failing batches get decoded, for the error previews
+        snippets = _extract_error_snippets(batch_body.decode('utf-8', errors='replace'))
+        if snippets:
+            log(f"\n⚠️  Sample batch errors ({len(snippets)} shown):\n- " + "\n- ".join(snippets))
+
+    # None = not known yet; the first compressed batch doubles as the probe
+    gzip_accepted = None if compress else False
+
     def upsert_batch(chunk):
-        body, batch_id = build_batch(chunk)
+        nonlocal gzip_accepted
+        raw, batch_id = build_batch(chunk)
+        throttled = False
+        started = time.time()
         headers = {
             "Content-Type": f"multipart/mixed; boundary={batch_id}",
             "Prefer": "odata.continue-on-error"
         }
+        body = raw
+        if gzip_accepted is not False and len(raw) > 4096:
+            # Repeated boundaries/headers/keys compress well; level 1 keeps it cheap
+            body = gzip.compress(raw, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
 
         last_error_preview = None
-        for _ in range(5):
+        splittable = False
+        for attempt in range(5):
             try:
-                r = session.post(batch_url, headers=headers, data=body, timeout=600)
+                if HAVE_HTTP2:
+                    # httpx has no urllib3 Retry, so 429/5xx back off here (Retry-After first)
+                    r = session.post(batch_url, headers=headers, content=body)
+                    throttled |= r.status_code in _RETRY_STATUSES
+                    tune_batch_size(r.status_code == 429)
+                    if r.status_code in _RETRY_STATUSES and attempt < 4:
+                        # Jitter so throttled workers don't all wake and retry together
+                        time.sleep(retry_after_seconds(r.headers.get("Retry-After"), 1.5 * 2 ** attempt) + random.random() * 2)
+                        continue
+                else:
+                    # 429/5xx are retried inside the adapter, honouring Retry-After
+                    r = session.post(batch_url, headers=headers, data=body, timeout=600)
+                    throttled |= _was_throttled(r)
+                    tune_batch_size(_was_throttled(r))
+
+                if "Content-Encoding" in headers and r.status_code in (400, 415) and not gzip_accepted:
+                    # Server won't take a gzip'd body: resend plain and stop compressing
+                    if gzip_accepted is None:
+                        log(f"\nServer rejected gzip request body (HTTP {r.status_code}); sending uncompressed")
+                    gzip_accepted = False
+                    body = raw
+                    del headers["Content-Encoding"]
+                    continue
 
                 if r.status_code in (200, 204):
-                    batch_text = r.text if isinstance(r.text, str) else r.content.decode('utf-8', errors='replace')
-                    counts = _count_subresponses(batch_text, expected=len(chunk))
+                    if "Content-Encoding" in headers:
+                        gzip_accepted = True
+                    counts = _count_subresponses(r.content, expected=len(chunk))
                     if counts["errors"]:
-                        snippets = _extract_error_snippets(batch_text)
-                        if snippets:
-                            log(f"\n⚠️  Sample batch errors ({len(snippets)} shown):\n- " + "\n- ".join(snippets))
+                        if (len(chunk) > 1 and not counts["created"] and not counts["updated"]
+                                and not _AUTH_STATUSES.intersection(_STATUS_LINE_RE.findall(r.content))):
+                            # The changeset rolled back as a whole, usually on one bad row
+                            # (a 401/403 would fail every row alike, so that isn't split).
+                            # The error previews wait until the caller stops splitting.
+                            return {"split": _ROLLED_BACK, "error": batch_error_signature(r.content), "body": r.content}
+                        log_errors(r.content)
+                    counts.update(throttled=throttled, seconds=time.time() - started, size=len(chunk))
                     return counts
 
-                if r.status_code == 429:
-                    time.sleep(int(r.headers.get("Retry-After", 5)))
-                    continue
-
                 last_error_preview = f"HTTP {r.status_code}: {r.text[:800]}"
+                splittable = r.status_code >= 500
                 break
+            except _TIMEOUTS as e:
+                throttled = True
+                tune_batch_size(True)
+                last_error_preview = str(e)
+                splittable = True
+                time.sleep(3 + random.random() * 2)
             except Exception as e:
                 last_error_preview = str(e)
-                time.sleep(3)
+                splittable = False
+                time.sleep(3 + random.random() * 2)
 
         if last_error_preview:
             log(f"\n⚠️  Batch request failed: {last_error_preview}")
-        return {"created": 0, "updated": 0, "errors": len(chunk)}
+        if splittable and len(chunk) > 1:
+            # 5xx/timeouts that outlast the retries: let the caller bisect the batch
+            return {"split": _REQUEST_FAILED}
+        return {"created": 0, "updated": 0, "errors": len(chunk), "throttled": True}
 
-    # Create batches and process
-    batch_size = 400
-    batches = [valid_records[i:i + batch_size] for i in range(0, total, batch_size)]
-    log(f"Fast upserting {total:,} records in {len(batches)} batches of {batch_size} (6 parallel threads)")
+    # AIMD on batches in flight: +0.5 after each clean batch, halve on 429/5xx/timeouts or
+    # when a batch takes over twice the best seconds-per-record seen. Only one halving per
+    # round: batches sent before the last cut can't cut again.
+    concurrency = float(max_workers)
+    best_per_record = None
+    epoch = 0
+
+    def tune_concurrency(result, sent_epoch):
+        nonlocal concurrency, best_per_record, epoch
+        congested = result.get("throttled", False)
+        if "seconds" in result:
+            per_record = result["seconds"] / max(result["size"], 1)
+            if best_per_record is None or per_record < best_per_record:
+                best_per_record = per_record
+            congested = congested or per_record > best_per_record * 2
+        if not congested:
+            concurrency = min(max_concurrency, concurrency + 0.5)
+        elif sent_epoch == epoch:
+            concurrency = max(1.0, concurrency * 0.5)
+            epoch += 1
+
+    log(f"Fast upserting {f'{total:,}' if total is not None else 'streamed'} records in batches of ~{current_batch} ({max_workers} parallel threads, adaptive up to {max_concurrency})")
 
     total_created = 0
     total_updated = 0
     total_errors = 0
+    submitted = 0
     start_time = time.time()
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=6) as ex:
-        for future in concurrent.futures.as_completed([ex.submit(upsert_batch, c) for c in batches]):
-            result = future.result() or {"created": 0, "updated": 0, "errors": 0}
-            total_created += int(result.get("created", 0))
-            total_updated += int(result.get("updated", 0))
-            total_errors += int(result.get("errors", 0))
-            processed = total_created + total_updated + total_errors
-            ok = total_created + total_updated
-            rate = ok / (time.time() - start_time) if time.time() - start_time > 0 else 0
-            log(f"\r  Progress: {processed:,}/{total:,} records ({total_created:,} created, {total_updated:,} updated, {total_errors:,} errors) | {rate:,.0f} ok-rows/sec")
+    def collect(result, sent_epoch):
+        nonlocal total_created, total_updated, total_errors
+        result = result or {"created": 0, "updated": 0, "errors": 0}
+        tune_concurrency(result, sent_epoch)
+        total_created += int(result.get("created", 0))
+        total_updated += int(result.get("updated", 0))
+        total_errors += int(result.get("errors", 0))
+        processed = total_created + total_updated + total_errors
+        ok = total_created + total_updated
+        rate = ok / (time.time() - start_time) if time.time() - start_time > 0 else 0
+        log(f"\r  Progress: {processed:,}/{total if total is not None else submitted:,} records ({total_created:,} created, {total_updated:,} updated, {total_errors:,} errors) | {rate:,.0f} ok-rows/sec | batch {current_batch} x{int(concurrency)}")
+
+    # A batch that fails whole (5xx/timeouts after retries, or a rolled-back changeset) is
+    # split in half and both halves resubmitted, down to single rows, so one poisoned row
+    # costs itself rather than its 399 neighbours. The two halves share a dict:
+    # - a half that rolls back first waits there for its sibling. If the sibling rolls back
+    #   with the same error, every row is failing alike (missing key, renamed column), so
+    #   both halves count as errors; otherwise the waiting half splits further.
+    # - for 5xx/timeouts, once both halves have failed the server is at fault, not the
+    #   data, so that branch stops splitting.
+    def submit(ex, chunk, split=None):
+        pending[ex.submit(upsert_batch, chunk)] = (chunk, epoch, split)
+
+    def bisect(ex, chunk):
+        half = len(chunk) // 2
+        halves = {"failed": False, "settled": False}
+        submit(ex, chunk[:half], halves)
+        submit(ex, chunk[half:], halves)
+
+    def give_up(chunk, sent_epoch, throttled):
+        collect({"created": 0, "updated": 0, "errors": len(chunk), "throttled": throttled}, sent_epoch)
+
+    def collect_done(ex, return_when):
+        done, _ = concurrent.futures.wait(pending, return_when=return_when)
+        for future in done:
+            chunk, sent_epoch, split = pending.pop(future)
+            result = future.result()
+            first = split is not None and not split["settled"]
+            waiting = None
+            if split is not None:
+                split["settled"] = True
+                waiting = split.pop("waiting", None)
+            if result.get("split") == _ROLLED_BACK:
+                if first:
+                    split["waiting"] = (chunk, sent_epoch, result)
+                elif waiting is not None and waiting[2]["error"] == result["error"]:
+                    log(f"\n⚠️  Both halves of a {len(chunk) + len(waiting[0])}-row batch failed alike; not splitting further")
+                    log_errors(result["body"])
+                    give_up(waiting[0], waiting[1], False)
+                    give_up(chunk, sent_epoch, False)
+                else:
+                    if waiting is not None:
+                        bisect(ex, waiting[0])
+                    bisect(ex, chunk)
+                continue
+            if waiting is not None:
+                # Only the sibling rolled back, so the bad rows are on that side
+                bisect(ex, waiting[0])
+            if result.get("split") == _REQUEST_FAILED:
+                stop = split is not None and split["failed"]
+                if split is not None:
+                    split["failed"] = True
+                if not stop:
+                    tune_concurrency({"throttled": True}, sent_epoch)
+                    bisect(ex, chunk)
+                    continue
+                result = {"created": 0, "updated": 0, "errors": len(chunk), "throttled": True}
+            collect(result, sent_epoch)
+
+    it = iter(records)
+    pending = {}
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as ex:
+            # First batch goes alone: it opens the one HTTP/2 connection the workers then
+            # multiplex their batches over (instead of each racing to open its own), and
+            # settles the gzip probe before the pool fans out
+            if (chunk := list(islice(it, current_batch))):
+                submitted += len(chunk)
+                submit(ex, chunk)
+                collect_done(ex, concurrent.futures.FIRST_COMPLETED)
+            while True:
+                while len(pending) >= int(concurrency):
+                    collect_done(ex, concurrent.futures.FIRST_COMPLETED)
+                if not (chunk := list(islice(it, current_batch))):
+                    break
+                submitted += len(chunk)
+                submit(ex, chunk)
+            while pending:
+                collect_done(ex, concurrent.futures.ALL_COMPLETED)
+    finally:
+        session.close()
+
+    if submitted == 0:
+        log("No valid records to upsert")
+        return 0, 0, 0
 
     elapsed = time.time() - start_time
-    log(f"\nFast upsert complete: {total_created:,} created, {total_updated:,} updated, {total_errors:,} errors in {elapsed:.1f}s → {(total_created+total_updated)/elapsed:,.0f} rows/sec")
+    log(f"\nFast upsert complete: {total_created:,} created, {total_updated:,} updated, {total_errors:,} errors in {elapsed:.1f}s → {(total_created+total_updated)/elapsed:,.0f} rows/sec (final batch size {current_batch})")
     return total_created, total_updated, total_errors
@@ -11,10 +11,81 @@ parser since they all follow the same 2D table structure:
 The ONLY cube-specific part is hierarchy name → field name mapping.
 """
 
+import io
 import re
-import xml.etree.ElementTree as ET
-import pandas as pd
-from typing import Dict, List, Tuple, Optional
+from typing import TYPE_CHECKING, BinaryIO, Dict, List, Tuple, Optional, Union
+
+# numpy/pandas are imported where a response is parsed, so importing this module
+# (e.g. to validate hierarchy_mappings) doesn't pay for them
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    from lxml import etree as ET
+    _HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+    _HAVE_LXML = False
+
+# XMLA Multidimensional (mddataset) element tags
+_MD = '{urn:schemas-microsoft-com:xml-analysis:mddataset}'
+_MD_AXIS = _MD + 'Axis'
+_MD_TUPLES = _MD + 'Tuples'
+_MD_TUPLE = _MD + 'Tuple'
+_MD_MEMBER = _MD + 'Member'
+_MD_CAPTION = _MD + 'Caption'
+_MD_CELLDATA = _MD + 'CellData'
+_MD_CELL = _MD + 'Cell'
+_MD_VALUE = _MD + 'Value'
+
+# Only these elements drive the parser; lxml can skip events for everything else
+_MD_EVENT_TAGS = (_MD_AXIS, _MD_TUPLES, _MD_TUPLE, _MD_CELLDATA, _MD_CELL)
+
+# Raw cell texts converted to floats per block of this many cells
+CELL_BLOCK_SIZE = 65536
+
+
+_REGEX_META = frozenset('.^$*+?{}[]\\|()')
+
+
+def _literal_parts(pattern: str) -> Optional[Tuple[str, ...]]:
+    """
+    Split a pattern of plain literals joined by '.*' (e.g. "Franchise.*Store",
+    ".*Item_Number") into its literals; None if it uses any other regex syntax.
+    """
+    parts = tuple(part for part in pattern.split('.*') if part)
+    if not parts or any(_REGEX_META.intersection(part) for part in parts):
+        return None
+    return parts
+
+
+def _contains_in_order(text: str, parts: Tuple[str, ...]) -> bool:
+    """True if every literal occurs in text, in order and without overlapping"""
+    pos = 0
+    for part in parts:
+        pos = text.find(part, pos)
+        if pos < 0:
+            return False
+        pos += len(part)
+    return True
+
+
+def _child(elem, tag):
+    """Return elem's first direct child with this tag (None if missing)"""
+    for child in elem:
+        if child.tag == tag:
+            return child
+    return None
+
+
+def _release(elem, container):
+    """Free a fully-processed Tuple/Cell (and anything before it) from the tree"""
+    if _HAVE_LXML:
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+    elif container is not None:
+        container.clear()
 
 
 class GenericXMLAParser:
@@ -45,10 +116,30 @@ class GenericXMLAParser:
             (re.compile(m['pattern']), m['field']) 
             for m in hierarchy_mappings
         ]
+        # All patterns fused into one regex tried at the start of the name: each alternative
+        # skips ahead lazily, so alternatives are tried in config order just like the loop
+        # below and the first mapping whose pattern matches anywhere wins. Patterns that
+        # can't be fused (capture groups, inline flags) keep the loop.
+        self._combined_pattern = None
+        if hierarchy_mappings and not any(pattern.groups for pattern, _ in self._compiled_patterns):
+            try:
+                self._combined_pattern = re.compile('|'.join(
+                    f"(?P<f{i}>[\\s\\S]*?(?:{m['pattern']}))" for i, m in enumerate(hierarchy_mappings)
+                ))
+            except re.error:
+                pass
+        self._fields = [m['field'] for m in hierarchy_mappings]
+        # The usual "Literal.*Literal" patterns need no regex at all: str.find in order
+        # gives the same answer as re.search (for names without newlines)
+        literal_parts = [_literal_parts(m['pattern']) for m in hierarchy_mappings]
+        self._literal_patterns = literal_parts if all(literal_parts) else None
+        # A response only carries a handful of distinct hierarchies, so each is matched once
+        self._field_cache: Dict[str, Optional[str]] = {}
     
     def _match_hierarchy_to_field(self, hierarchy: str) -> Optional[str]:
         """
         Match a hierarchy name to its configured field name using regex patterns.
+        Results are cached per hierarchy name.
         
         Args:
             hierarchy: Full hierarchy name like "[Franchise].[Store Number Label]"
@@ -56,114 +147,196 @@ class GenericXMLAParser:
         Returns:
             Field name like "StoreNumber", or None if no match
         """
-        for pattern, field in self._compiled_patterns:
-            if pattern.search(hierarchy):
-                return field
-        return None
+        try:
+            return self._field_cache[hierarchy]
+        except KeyError:
+            pass
+        field_name = None
+        if self._literal_patterns is not None and '\n' not in hierarchy:
+            for parts, field in zip(self._literal_patterns, self._fields):
+                if _contains_in_order(hierarchy, parts):
+                    field_name = field
+                    break
+        elif self._combined_pattern is not None:
+            m = self._combined_pattern.match(hierarchy)
+            if m:
+                field_name = self._fields[int(m.lastgroup[1:])]
+        else:
+            for pattern, field in self._compiled_patterns:
+                if pattern.search(hierarchy):
+                    field_name = field
+                    break
+        self._field_cache[hierarchy] = field_name
+        return field_name
     
-    def parse_response(self, xml_response: str, logger=None) -> pd.DataFrame:
+    @staticmethod
+    def _store_cells(values, text_values, ordinals, texts):
+        """
+        Convert a block of raw cell texts in one pass and write them into the
+        measure block at their ordinals (out-of-range ordinals are dropped).
+        Texts that aren't numbers go to text_values, allocated on first use.
+        Returns text_values.
+        """
+        import numpy as np
+        
+        ordinals = np.fromiter(ordinals, dtype=np.int64, count=len(ordinals))
+        kept = np.flatnonzero((ordinals >= 0) & (ordinals < values.size))
+        rows, cols = np.divmod(ordinals[kept], values.shape[1])
+        try:
+            # float() semantics (exact rounding, unlike pd.to_numeric), without a per-cell
+            # try/except or a numpy scalar store per cell
+            numbers = np.fromiter(map(float, texts), dtype=np.float64, count=len(texts))
+        except ValueError:
+            # Some text in this block isn't a number: convert cell by cell
+            numbers = np.full(len(texts), np.nan)
+            for i in kept:
+                try:
+                    numbers[i] = float(texts[i])
+                except ValueError:
+                    if text_values is None:
+                        text_values = np.full(values.shape, None, dtype=object)
+                    text_values[divmod(ordinals[i], values.shape[1])] = texts[i]
+        values[rows, cols] = numbers[kept]
+        return text_values
+    
+    def parse_response(self, xml_response: Union[str, bytes, BinaryIO], logger=None) -> "pd.DataFrame":
         """
         Parse XMLA response into DataFrame using configured hierarchy mappings.
         
         This is the UNIVERSAL parser that works for ALL MDX queries.
         
         Args:
-            xml_response: Raw XMLA XML response string
+            xml_response: Raw XMLA response as bytes (preferred: parsed as-is,
+                          no decode/re-encode copy), str or a binary file-like object
             logger: Optional logger for info messages
             
         Returns:
             DataFrame with dimension columns + measure columns
         """
+        import numpy as np
+        import pandas as pd
+        
         def log(msg: str):
             if logger:
                 logger.info(msg)
         
-        root = ET.fromstring(xml_response)
+        # One streaming pass (lxml when installed, else the stdlib): Tuples and
+        # Cells are dropped as soon as they are read, so memory stays flat
+        if isinstance(xml_response, str):
+            xml_response = xml_response.encode('utf-8')
+        if isinstance(xml_response, bytes):
+            xml_response = io.BytesIO(xml_response)
         
-        # Define namespaces
-        ns = {
-            'soap': 'http://schemas.xmlsoap.org/soap/envelope/',
-            'xmla': 'urn:schemas-microsoft-com:xml-analysis',
-            'mdd': 'urn:schemas-microsoft-com:xml-analysis:mddataset'
-        }
+        measure_names = []  # Axis0 (COLUMNS): measure captions
+        dim_columns = {}    # Axis1 (ROWS): dimension captions, one list per field
+        num_rows = 0
+        values = None       # CellData: (rows x measures) float block, allocated once the axes are known
+        text_values = None  # non-numeric cells, same shape; only allocated if one turns up
+        cell_count = 0
+        block_ordinals = [] # CellData: cells read but not yet converted
+        block_texts = []
+        unmapped = set()    # hierarchies already warned about
+        axis_name = None
+        container = None
         
-        # 1. Parse Axis0 (COLUMNS) - Get measure names
-        axis0 = root.find('.//mdd:Axis[@name="Axis0"]', ns)
-        measure_names = []
+        # huge_tree lifts libxml2's size limits, which a multi-year response can exceed
+        iterparse_kwargs = {'tag': _MD_EVENT_TAGS, 'huge_tree': True} if _HAVE_LXML else {}
+        for event, elem in ET.iterparse(xml_response, events=('start', 'end'), **iterparse_kwargs):
+            tag = elem.tag
+            if event == 'start':
+                if tag == _MD_AXIS:
+                    axis_name = elem.get('name')
+                elif tag == _MD_TUPLES:
+                    container = elem
+                elif tag == _MD_CELLDATA:
+                    container = elem
+                    # Axes always precede CellData, so the grid size is final here
+                    values = np.full((num_rows, len(measure_names)), np.nan, order='F')
+                continue
+            
+            # Cells far outnumber everything else, so they are tested first. Tags are
+            # compared by value: neither lxml nor ElementTree hands back the same str
+            # object for .tag, so an identity check against interned constants never hits
+            if tag == _MD_CELL:
+                # 3. CellData - values mapped by ordinal = row_idx * num_measures + col_idx
+                ordinal = int(elem.get('CellOrdinal', -1))
+                # Value is a direct child (normally the first), so no path search
+                value_elem = _child(elem, _MD_VALUE)
+                value = value_elem.text if value_elem is not None else None
+                if value:
+                    cell_count += 1
+                    block_ordinals.append(ordinal)
+                    block_texts.append(value)
+                    if len(block_texts) >= CELL_BLOCK_SIZE:
+                        text_values = self._store_cells(values, text_values, block_ordinals, block_texts)
+                        block_ordinals, block_texts = [], []
+                _release(elem, container)
+            elif tag == _MD_TUPLE:
+                if axis_name == 'Axis0':
+                    # 1. Axis0 (COLUMNS) - measure names
+                    for member in elem:
+                        caption_elem = _child(member, _MD_CAPTION) if member.tag == _MD_MEMBER else None
+                        if caption_elem is not None:
+                            measure_names.append(caption_elem.text)
+                elif axis_name == 'Axis1':
+                    # 2. Axis1 (ROWS) - dimension tuples, appended column-wise
+                    for member in elem:
+                        caption_elem = _child(member, _MD_CAPTION) if member.tag == _MD_MEMBER else None
+                        if caption_elem is not None:
+                            # Use config to map hierarchy → field name
+                            hierarchy = member.get('Hierarchy', '')
+                            field_name = self._match_hierarchy_to_field(hierarchy)
+                            if not field_name:
+                                # Fallback: use hierarchy name as-is (warned once per response)
+                                if hierarchy not in unmapped:
+                                    unmapped.add(hierarchy)
+                                    log(f"WARNING: No mapping for hierarchy '{hierarchy}', using as-is")
+                                field_name = hierarchy
+                            column = dim_columns.get(field_name)
+                            if column is None:
+                                # First seen on this row: earlier rows had no value for it
+                                column = dim_columns[field_name] = [None] * num_rows
+                            if len(column) > num_rows:
+                                column[num_rows] = caption_elem.text  # repeated field: last wins
+                            else:
+                                column.append(caption_elem.text)
+                    num_rows += 1
+                    for column in dim_columns.values():
+                        if len(column) < num_rows:
+                            column.append(None)
+                _release(elem, container)
+            elif tag == _MD_AXIS:
+                axis_name = None
         
-        if axis0 is not None:
-            for tuple_elem in axis0.findall('.//mdd:Tuple', ns):
-                for member in tuple_elem.findall('.//mdd:Member', ns):
-                    caption_elem = member.find('mdd:Caption', ns)
-                    if caption_elem is not None:
-                        measure_names.append(caption_elem.text)
+        if block_texts:
+            text_values = self._store_cells(values, text_values, block_ordinals, block_texts)
         
         if not measure_names:
             raise ValueError("No measures found on Axis0")
-        
         log(f"Found {len(measure_names)} measures: {measure_names}")
         
-        # 2. Parse Axis1 (ROWS) - Get dimension tuples
-        axis1 = root.find('.//mdd:Axis[@name="Axis1"]', ns)
-        row_tuples = []
-        
-        if axis1 is not None:
-            for tuple_elem in axis1.findall('.//mdd:Tuple', ns):
-                row_info = {}
-                
-                for member in tuple_elem.findall('.//mdd:Member', ns):
-                    hierarchy = member.get('Hierarchy', '')
-                    caption_elem = member.find('mdd:Caption', ns)
-                    
-                    if caption_elem is not None:
-                        # Use config to map hierarchy → field name
-                        field_name = self._match_hierarchy_to_field(hierarchy)
-                        if field_name:
-                            row_info[field_name] = caption_elem.text
-                        else:
-                            # Fallback: use hierarchy name as-is
-                            log(f"WARNING: No mapping for hierarchy '{hierarchy}', using as-is")
-                            row_info[hierarchy] = caption_elem.text
-                
-                row_tuples.append(row_info)
-        
-        if not row_tuples:
+        if not num_rows:
             raise ValueError("No row tuples found on Axis1")
+        log(f"Found {num_rows} row tuples")
         
-        log(f"Found {len(row_tuples)} row tuples")
-        
-        # 3. Parse CellData - Get values mapped by ordinal
-        celldata = root.find('.//mdd:CellData', ns)
-        cell_values = {}
-        
-        if celldata is not None:
-            for cell in celldata.findall('.//mdd:Cell', ns):
-                ordinal = int(cell.get('CellOrdinal', -1))
-                value_elem = cell.find('mdd:Value', ns)
-                
-                if value_elem is not None and value_elem.text:
-                    try:
-                        cell_values[ordinal] = float(value_elem.text)
-                    except ValueError:
-                        cell_values[ordinal] = value_elem.text
+        log(f"Found {cell_count} cell values")
         
-        log(f"Found {len(cell_values)} cell values")
-        
-        # 4. Build DataFrame: Map cells to (row, measure) pairs
-        data_rows = []
-        num_measures = len(measure_names)
-        
-        for row_idx, row_tuple in enumerate(row_tuples):
-            row_data = row_tuple.copy()  # Start with dimension values
-            
-            # Add measure values using ordinal formula
-            for col_idx, measure_name in enumerate(measure_names):
-                ordinal = row_idx * num_measures + col_idx
-                row_data[measure_name] = cell_values.get(ordinal, None)
-            
-            data_rows.append(row_data)
+        # 4. Build DataFrame column-wise: dimension lists + measure block columns (missing cells = NaN)
+        if values is None:
+            values = np.full((num_rows, len(measure_names)), np.nan, order='F')
+        columns = dict(dim_columns)
+        for col_idx, measure_name in enumerate(measure_names):
+            columns[measure_name] = values[:, col_idx]
+        if text_values is not None:
+            # Measures with non-numeric cells become object columns mixing floats and text
+            for col_idx in np.flatnonzero((text_values != None).any(axis=0)):  # noqa: E711
+                column = values[:, col_idx].astype(object)
+                column[np.isnan(values[:, col_idx])] = None
+                texts = text_values[:, col_idx] != None  # noqa: E711
+                column[texts] = text_values[texts, col_idx]
+                columns[measure_names[col_idx]] = column
         
-        df = pd.DataFrame(data_rows)
+        df = pd.DataFrame(columns)
         log(f"Built DataFrame with shape: {df.shape}")
         log(f"Columns: {list(df.columns)}")
         
@@ -1,12 +1,80 @@
-import requests
-import msal
+import functools
 import os
+import time
 import traceback
-from modules.utils.keyvault import get_secret
 from modules.utils.config import load_config
 
+# requests, msal and the Key Vault client (azure-identity) are imported on first use,
+# so importing this module for send_email_notification costs nothing until a mail is sent
+
+# Config and the Key Vault secret are re-read at most this often, so a run that
+# sends several notifications loads them once
+_CACHE_TTL = 3600
+
+_config_cache = (0.0, None)
+_secret_cache = (0.0, None)
+
+
+def _cached_config():
+    global _config_cache
+    loaded_at, config = _config_cache
+    if config is None or time.time() - loaded_at > _CACHE_TTL:
+        config = load_config()
+        _config_cache = (time.time(), config)
+    return config
+
+
+def _cached_client_secret():
+    global _secret_cache
+    loaded_at, secret = _secret_cache
+    if not secret or time.time() - loaded_at > _CACHE_TTL:
+        from modules.utils.keyvault import get_secret
+        secret = get_secret('app-client-secret')
+        _secret_cache = (time.time(), secret)
+    return secret
+
+
+@functools.lru_cache(maxsize=1)
+def _graph_session():
+    # One keep-alive session for Graph and the token endpoint, so only the first
+    # notification pays the TLS handshake. sendMail POSTs are only retried on 429/503
+    # (throttled/unavailable, message not taken), not on other 5xx that may have sent it.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[429, 503],
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        ),
+    ))
+    return session
+
+
+@functools.lru_cache(maxsize=4)
+def _graph_app(client_id, client_secret, tenant_id):
+    # One app per credential: its in-memory token cache then serves every later
+    # notification until the token nears expiry
+    import msal
+    
+    return msal.ConfidentialClientApplication(
+        client_id,
+        authority=f"https://login.microsoftonline.com/{tenant_id}",
+        client_credential=client_secret,
+        http_client=_graph_session()
+    )
+
+
 def get_graph_access_token(client_id, client_secret, tenant_id, logger=None):
-    """Obtain an access token for Microsoft Graph API."""
+    """Obtain an access token for Microsoft Graph API (reused from MSAL's cache while valid)."""
     def log(msg):
         if logger:
             logger.info(msg)
@@ -14,12 +82,7 @@ def get_graph_access_token(client_id, client_secret, tenant_id, logger=None):
             print(msg)
     
     try:
-        authority = f"https://login.microsoftonline.com/{tenant_id}"
-        app = msal.ConfidentialClientApplication(
-            client_id,
-            authority=authority,
-            client_credential=client_secret
-        )
+        app = _graph_app(client_id, client_secret, tenant_id)
         scope = ["https://graph.microsoft.com/.default"]
         result = app.acquire_token_for_client(scopes=scope)
         
@@ -55,7 +118,7 @@ def send_email_notification(subject, body, recipients=None, is_html=False, logge
     
     try:
         # Load config to get recipients and Azure credentials
-        config = load_config()
+        config = _cached_config()
         
         # Check if email notifications are enabled
         if not config.get('email_notifications', {}).get('enabled', False):
@@ -77,7 +140,7 @@ def send_email_notification(subject, body, recipients=None, is_html=False, logge
         
         if not client_secret:
             # Try to get from Key Vault
-            client_secret = get_secret('app-client-secret')
+            client_secret = _cached_client_secret()
         
         if not client_secret:
             log("Failed to get Azure client secret for email")
@@ -124,7 +187,7 @@ def send_email_notification(subject, body, recipients=None, is_html=False, logge
         # Sends on behalf of the specified user
         graph_url = f"https://graph.microsoft.com/v1.0/users/{sender_email}/sendMail"
         
-        response = requests.post(graph_url, headers=headers, json=message)
+        response = _graph_session().post(graph_url, headers=headers, json=message, timeout=30)
         
         if response.status_code == 202:
             log(f"✓ Email sent successfully to {len(recipients)} recipient(s)")
@@ -5,7 +5,11 @@ import pandas as pd
 import traceback
 
 def execute_xmla_mdx(server, catalog, username, password, mdx_query, ssl_verify=False, logger=None):
-    """Execute an MDX query via XMLA HTTP request and return response text."""
+    """
+    Execute an MDX query via XMLA HTTP request and return the response body as bytes.
+    
+    The parsers take bytes directly, so the (often multi-MB) body is never decoded to str.
+    """
     xmla_url = f"{server}/xmla/default" if not server.endswith("/xmla/default") else server
     
     # Use CDATA to avoid XML escaping issues with & characters in MDX
@@ -43,14 +47,14 @@ def execute_xmla_mdx(server, catalog, username, password, mdx_query, ssl_verify=
     if response.status_code != 200:
         raise Exception(f"XMLA query failed with HTTP {response.status_code}: {response.text[:500]}")
     
-    return response.text
+    return response.content
 
 def parse_xmla_celldata_response(xml_response, logger=None):
     """
     Parse XMLA CellData format response into a pandas DataFrame.
     
     Args:
-        xml_response: XML string from XMLA Execute response
+        xml_response: XML bytes (or string) from XMLA Execute response
         logger: Optional logger
     
     Returns:
@@ -132,23 +136,18 @@ def parse_xmla_celldata_response(xml_response, logger=None):
         
         # Build DataFrame: Map cells to rows
         # CellOrdinal = row_idx * num_measures + col_idx
+        # (row dicts are filled in place: they aren't used again, so no copies)
         num_measures = len(measure_names)
-        rows = []
         
-        for row_idx, row_info in enumerate(row_tuples):
-            row_data = row_info.copy()
-            
+        for row_idx, row_data in enumerate(row_tuples):
+            base = row_idx * num_measures
             for col_idx, measure_name in enumerate(measure_names):
-                ordinal = row_idx * num_measures + col_idx
-                value = cells.get(ordinal)
-                row_data[measure_name] = value
-            
-            rows.append(row_data)
+                row_data[measure_name] = cells.get(base + col_idx)
         
-        log(f"   Built {len(rows)} data rows")
+        log(f"   Built {len(row_tuples)} data rows")
         
-        if rows:
-            df = pd.DataFrame(rows)
+        if row_tuples:
+            df = pd.DataFrame(row_tuples)
             return df
         else:
             log("   No data rows built")
@@ -164,7 +163,7 @@ def parse_sales_channel_daily_response(xml_response, logger=None):
     Parse XMLA response for Sales Channel Daily query (5 dimensions, 5 measures).
     
     Args:
-        xml_response: XML string from XMLA Execute response
+        xml_response: XML bytes (or string) from XMLA Execute response
         logger: Optional logger
     
     Returns:
@@ -254,23 +253,18 @@ def parse_sales_channel_daily_response(xml_response, logger=None):
         
         # Build DataFrame: Map cells to rows
         # CellOrdinal = row_idx * num_measures + col_idx
+        # (row dicts are filled in place: they aren't used again, so no copies)
         num_measures = len(measure_names)
-        rows = []
         
-        for row_idx, row_info in enumerate(row_tuples):
-            row_data = row_info.copy()
-            
+        for row_idx, row_data in enumerate(row_tuples):
+            base = row_idx * num_measures
             for col_idx, measure_name in enumerate(measure_names):
-                ordinal = row_idx * num_measures + col_idx
-                value = cells.get(ordinal)
-                row_data[measure_name] = value
-            
-            rows.append(row_data)
+                row_data[measure_name] = cells.get(base + col_idx)
         
-        log(f"   Built {len(rows)} data rows")
+        log(f"   Built {len(row_tuples)} data rows")
         
-        if rows:
-            df = pd.DataFrame(rows)
+        if row_tuples:
+            df = pd.DataFrame(row_tuples)
             return df
         else:
             log("   No data rows built")
@@ -287,7 +281,7 @@ def parse_offers_response(xml_response, logger=None):
     Parse XMLA response for Offers query (4 dimensions).
     
     Args:
-        xml_response: XML string from XMLA Execute response
+        xml_response: XML bytes (or string) from XMLA Execute response
         logger: Optional logger
     
     Returns:
@@ -375,23 +369,18 @@ def parse_offers_response(xml_response, logger=None):
         
         # Build DataFrame: Map cells to rows
         # CellOrdinal = row_idx * num_measures + col_idx
+        # (row dicts are filled in place: they aren't used again, so no copies)
         num_measures = len(measure_names)
-        rows = []
         
-        for row_idx, row_info in enumerate(row_tuples):
-            row_data = row_info.copy()
-            
+        for row_idx, row_data in enumerate(row_tuples):
+            base = row_idx * num_measures
             for col_idx, measure_name in enumerate(measure_names):
-                ordinal = row_idx * num_measures + col_idx
-                value = cells.get(ordinal)
-                row_data[measure_name] = value
-            
-            rows.append(row_data)
+                row_data[measure_name] = cells.get(base + col_idx)
         
-        log(f"   Built {len(rows)} data rows")
+        log(f"   Built {len(row_tuples)} data rows")
         
-        if rows:
-            df = pd.DataFrame(rows)
+        if row_tuples:
+            df = pd.DataFrame(row_tuples)
             return df
         else:
             log("   No data rows built")
@@ -408,7 +397,7 @@ def parse_inventory_response(xml_response, logger=None):
     Parse XMLA response for Inventory query (measure on COLUMNS, 4 dimensions on ROWS).
     
     Args:
-        xml_response: XML string from XMLA Execute response
+        xml_response: XML bytes (or string) from XMLA Execute response
         logger: Optional logger
     
     Returns:
@@ -496,23 +485,18 @@ def parse_inventory_response(xml_response, logger=None):
         
         # Build DataFrame: Map cells to rows
         # CellOrdinal = row_idx * num_measures + col_idx
+        # (row dicts are filled in place: they aren't used again, so no copies)
         num_measures = len(measure_names)
-        rows = []
         
-        for row_idx, row_info in enumerate(row_tuples):
-            row_data = row_info.copy()
-            
+        for row_idx, row_data in enumerate(row_tuples):
+            base = row_idx * num_measures
             for col_idx, measure_name in enumerate(measure_names):
-                ordinal = row_idx * num_measures + col_idx
-                value = cells.get(ordinal)
-                row_data[measure_name] = value
-            
-            rows.append(row_data)
+                row_data[measure_name] = cells.get(base + col_idx)
         
-        log(f"   Built {len(rows)} data rows")
+        log(f"   Built {len(row_tuples)} data rows")
         
-        if rows:
-            df = pd.DataFrame(rows)
+        if row_tuples:
+            df = pd.DataFrame(row_tuples)
             return df
         else:
             log("   No data rows built")